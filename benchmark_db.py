@@ -0,0 +1,145 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import secrets
+import sqlite3
+import sys
+import tempfile
+import time
+import database_setup
+from db_backends import SQLiteBackend, create_backend
+from password_hashing import HASH_MIN_LOG_COST, PasswordHasher, set_password_hasher
+
+def percentiles(values):
+    """p50/p95/p99 (and mean/max) of a list of millisecond values"""
+    if not values:
+        return None
+    values = sorted(values)
+
+    def at(fraction):
+        return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+    return {
+        'count': len(values),
+        'mean_ms': sum(values) / len(values),
+        'p50_ms': at(0.50),
+        'p95_ms': at(0.95),
+        'p99_ms': at(0.99),
+        'max_ms': values[-1],
+    }
+
+def timed(samples, name, fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    samples.setdefault(name, []).append((time.perf_counter() - started) * 1000.0)
+    return result
+
+def run_benchmark(users, iterations, batch_size):
+    """Time each database operation the application performs; returns per-operation percentiles"""
+    samples = {}
+    prefix = f"bench_{secrets.token_hex(3)}_"
+    usernames = [f"{prefix}{i}" for i in range(users)]
+
+    half = users // 2
+    for username in usernames[:half]:
+        timed(samples, 'register_user', database_setup.register_user_to_db, username, "password", "user", "")
+    for start in range(half, users, batch_size):
+        batch = [(username, "password", "user", "") for username in usernames[start:start + batch_size]]
+        timed(samples, f'register_users_batch_{batch_size}', database_setup.register_users_to_db, batch)
+
+    for i in range(iterations):
+        username = usernames[i % users]
+        # Cold: the user cache is emptied so every lookup goes to the database
+        database_setup.invalidate_user(username)
+        timed(samples, 'verify_credentials_cold', database_setup.verify_user_credentials, username, "password")
+        timed(samples, 'verify_credentials_cached', database_setup.verify_user_credentials, username, "password")
+        timed(samples, 'complete_login', database_setup.complete_login, username, True)
+        # The next login of the same user: served by the record complete_login wrote through
+        timed(samples, 'verify_credentials_repeat', database_setup.verify_user_credentials, username, "password")
+        timed(samples, 'update_last_login', database_setup.update_last_login, username)
+
+    cursor = None
+    for _ in range(max(1, iterations // 10)):
+        database_setup.invalidate_user(prefix)
+        _, cursor = timed(samples, 'list_users_page', database_setup.list_users_page, cursor,
+                          database_setup.USER_PAGE_SIZE, None, prefix)
+        database_setup.invalidate_user(prefix)
+        timed(samples, 'list_users_page_role_filter', database_setup.list_users_page, None,
+              database_setup.USER_PAGE_SIZE, "user", prefix)
+
+    writer = database_setup.get_audit_writer()
+    started = time.perf_counter()
+    for i in range(iterations):
+        writer.record(usernames[i % users], success=False)
+    writer.flush()
+    audit_seconds = time.perf_counter() - started
+
+    for username in usernames:
+        timed(samples, 'delete_user', database_setup.delete_user_from_db, username)
+
+    report = {name: percentiles(values) for name, values in samples.items()}
+    report['audit_log_throughput_per_s'] = iterations / audit_seconds if audit_seconds else None
+    report['user_cache'] = database_setup.user_cache_stats()
+    return report
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark per-operation database latency on a backend")
+    parser.add_argument("--backend", choices=("sqlite", "mysql"), default="sqlite")
+    parser.add_argument("--sqlite-path", help="SQLite database file (default: a temporary file)")
+    parser.add_argument("--users", type=int, default=200, help="Users created (and deleted) by the run")
+    parser.add_argument("--iterations", type=int, default=500, help="Login operations timed")
+    parser.add_argument("--batch-size", type=int, default=50, help="Users per bulk registration")
+    parser.add_argument("--hash-log-cost", type=int, default=HASH_MIN_LOG_COST,
+                        help="Fixed scrypt log2(N), so runs on different machines are comparable")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    options = parse_args(argv)
+
+    temp_dir = None
+    if options.backend == "sqlite":
+        path = options.sqlite_path
+        if not path:
+            temp_dir = tempfile.TemporaryDirectory()
+            path = os.path.join(temp_dir.name, "benchmark.db")
+        backend = SQLiteBackend(path)
+    else:
+        # Uses the configured MySQL database; benchmark users are removed at the end
+        backend = create_backend("mysql", database_setup.DB_CONFIG)
+
+    database_setup.set_backend(backend)
+    set_password_hasher(PasswordHasher(log_cost=options.hash_log_cost))
+    backend.create_schema()
+    try:
+        # Keep the per-operation status messages out of the JSON report
+        with contextlib.redirect_stdout(sys.stderr):
+            operations = run_benchmark(options.users, options.iterations, options.batch_size)
+    finally:
+        database_setup.get_audit_writer().close()
+        database_setup.get_connection_pool().close()
+        if temp_dir is not None:
+            temp_dir.cleanup()
+
+    report = {
+        'config': {key: value for key, value in vars(options).items() if key != 'output'},
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'sqlite': sqlite3.sqlite_version,
+        },
+        'operations': operations,
+    }
+    output = json.dumps(report, indent=2)
+    if options.output:
+        with open(options.output, 'w') as f:
+            f.write(output)
+        print(f"✅ Benchmark report written to {options.output}")
+    else:
+        print(output)
+    return report
+
+if __name__ == "__main__":
+    main()
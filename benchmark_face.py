@@ -0,0 +1,192 @@
+import argparse
+import json
+import platform
+import time
+import cv2
+import numpy as np
+import face_recognition
+from face_module import (
+    FaceDetector,
+    FaceTracker,
+    FaceQualityGate,
+    SequentialVerifier,
+    PipelineStats,
+    iter_frames,
+    load_known_encoding,
+    verify_frames,
+    DETECTION_SCALE,
+    DETECTION_MODEL,
+    DETECTION_UPSAMPLE,
+    MAX_VERIFICATION_ATTEMPTS,
+)
+
+SYNTHETIC_SIZE = (480, 640)  # Height, width of generated frames
+
+def synthetic_frames(count, image_path=None, seed=0):
+    """Generate jittered frames from an image (or noise if none is given)"""
+    rng = np.random.default_rng(seed)
+    if image_path:
+        base = cv2.imread(image_path, cv2.IMREAD_COLOR)
+        if base is None:
+            raise ValueError(f"Cannot read image: {image_path}")
+    else:
+        base = rng.integers(64, 192, size=(*SYNTHETIC_SIZE, 3), dtype=np.uint8)
+
+    frames = []
+    for _ in range(count):
+        # Small head movement, lighting change and sensor noise per frame
+        shift_y, shift_x = rng.integers(-8, 9, size=2)
+        frame = np.roll(base, (int(shift_y), int(shift_x)), axis=(0, 1)).astype(np.int16)
+        frame += int(rng.integers(-20, 21))
+        frame += rng.normal(0, 4, size=frame.shape).astype(np.int16)
+        frames.append(np.clip(frame, 0, 255).astype(np.uint8))
+    return frames
+
+def reference_encoding(frames, detector):
+    """Encoding of the first face found in the frames (replay against itself)"""
+    for frame in frames:
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        face_locations = detector.detect(rgb_frame)
+        if face_locations:
+            encodings = face_recognition.face_encodings(rgb_frame, face_locations[:1])
+            if encodings:
+                return encodings[0]
+    return None
+
+def time_camera_open(device=0):
+    """Time opening the camera and reading its first frame, in milliseconds"""
+    started = time.perf_counter()
+    cam = cv2.VideoCapture(device)
+    opened = time.perf_counter()
+    result = {'opened': cam.isOpened(), 'open_ms': (opened - started) * 1000.0, 'first_frame_ms': None}
+    if result['opened']:
+        ret, _ = cam.read()
+        if ret:
+            result['first_frame_ms'] = (time.perf_counter() - opened) * 1000.0
+    cam.release()
+    return result
+
+def percentiles(values):
+    """p50/p95/p99 (and mean/max) of a list of millisecond values"""
+    if not values:
+        return None
+    values = np.asarray(values, dtype=np.float64)
+    return {
+        'count': int(values.size),
+        'mean_ms': float(values.mean()),
+        'p50_ms': float(np.percentile(values, 50)),
+        'p95_ms': float(np.percentile(values, 95)),
+        'p99_ms': float(np.percentile(values, 99)),
+        'max_ms': float(values.max()),
+    }
+
+def make_detector(options):
+    detector = FaceDetector(scale=options.scale, model=options.model, upsample=options.upsample,
+                            roi_margin=options.roi_margin)
+    if options.tracking:
+        return FaceTracker(detector)
+    return detector
+
+def run_benchmark(frames, known_encoding, options):
+    """Replay frames through verify_frames() and aggregate per-stage timings"""
+    stats = PipelineStats()
+    decisions = {}
+    decision_times = []
+    processing_time = 0.0
+
+    for _ in range(options.runs):
+        result = verify_frames(
+            known_encoding, frames,
+            detector=make_detector(options),
+            quality_gate=FaceQualityGate() if options.quality_gate else None,
+            decision_rule=SequentialVerifier() if options.voting else None,
+            max_frames=options.max_frames,
+            stats=stats,
+        )
+        # verify_frames stops at max_frames using the shared counter, so reset it per run
+        stats.frames_processed = 0
+        processing_time += result['elapsed']
+        decisions[result['decision']] = decisions.get(result['decision'], 0) + 1
+        if result['time_to_decision'] is not None:
+            decision_times.append(result['time_to_decision'] * 1000.0)
+
+    stages = stats.summary()
+    frames_processed = stages.get('convert', {}).get('count', 0)
+    return {
+        'stages': stages,
+        'frames_processed': frames_processed,
+        'frames_skipped': stats.frames_skipped,
+        'fps': frames_processed / processing_time if processing_time else 0.0,
+        'time_to_decision': percentiles(decision_times),
+        'decisions': decisions,
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the face verification pipeline")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--source", help="Video file or image directory to replay")
+    source.add_argument("--synthetic", type=int, metavar="N", help="Generate N jittered frames")
+    parser.add_argument("--image", help="Base image for --synthetic (default: noise)")
+    parser.add_argument("--username", help="Verify against this user's stored encoding "
+                                           "(default: the first face in the frames)")
+    parser.add_argument("--runs", type=int, default=5, help="Times to replay the frames")
+    parser.add_argument("--max-frames", type=int, default=MAX_VERIFICATION_ATTEMPTS)
+    parser.add_argument("--scale", type=float, default=DETECTION_SCALE)
+    parser.add_argument("--model", choices=("hog", "cnn"), default=DETECTION_MODEL)
+    parser.add_argument("--upsample", type=int, default=DETECTION_UPSAMPLE)
+    parser.add_argument("--roi-margin", type=float, default=None)
+    parser.add_argument("--tracking", action="store_true", help="Use FaceTracker between detections")
+    parser.add_argument("--quality-gate", action="store_true", help="Enable FaceQualityGate")
+    parser.add_argument("--voting", action="store_true", help="Decide with SequentialVerifier")
+    parser.add_argument("--camera", action="store_true", help="Also time opening camera 0")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    options = parse_args(argv)
+
+    started = time.perf_counter()
+    if options.synthetic:
+        frames = synthetic_frames(options.synthetic, options.image)
+    else:
+        frames = list(iter_frames(options.source))
+    load_ms = (time.perf_counter() - started) * 1000.0
+    if not frames:
+        raise SystemExit("❌ No frames to replay")
+
+    if options.username:
+        known_encoding = load_known_encoding(options.username)
+        if known_encoding is None:
+            raise SystemExit(f"❌ No face data for {options.username}")
+    else:
+        known_encoding = reference_encoding(frames, make_detector(options))
+        if known_encoding is None:
+            # No face anywhere: still measures detection, nothing can match
+            known_encoding = np.random.default_rng(0).normal(0, 0.1, 128)
+
+    report = {
+        'config': {key: value for key, value in vars(options).items() if key != 'output'},
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+        },
+        'frames_loaded': len(frames),
+        'load_ms': load_ms,
+    }
+    if options.camera:
+        report['camera'] = time_camera_open()
+    report.update(run_benchmark(frames, known_encoding, options))
+
+    output = json.dumps(report, indent=2)
+    if options.output:
+        with open(options.output, 'w') as f:
+            f.write(output)
+        print(f"✅ Benchmark report written to {options.output}")
+    else:
+        print(output)
+    return report
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+import argparse
+import csv
+import json
+import os
+import secrets
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+import face_recognition
+from face_store import FACE_DIR, face_image_path, has_embedding, save_embedding
+from face_module import IMAGE_EXTENSIONS, DETECTION_MODEL, DETECTION_UPSAMPLE
+from database_setup import register_users_to_db
+
+VALID_ROLES = {"admin", "user"}
+BATCH_SIZE = 100  # Users per database transaction
+PROGRESS_INTERVAL = 2.0  # Seconds between progress lines
+JOURNAL_FILE = "bulk_enroll.journal"  # One JSON line per user state change, for resume
+PASSWORD_FILE = "bulk_enroll_passwords.csv"  # username,password of generated one-time passwords (owner-only)
+FINISHED_STATUSES = {'enrolled', 'exists'}  # Journal states a resumed run skips; 'pending' and 'registered' users are finished
+
+def load_jobs(source, default_role="user"):
+    """Read (username, image_path, role, password) jobs from a directory or CSV manifest
+
+    A directory is taken as one <username>.<ext> image per user. A manifest
+    is a CSV with username and image columns and optional role and password
+    columns; relative image paths are resolved against the manifest.
+    """
+    jobs = []
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            username, extension = os.path.splitext(name)
+            if extension.lower() in IMAGE_EXTENSIONS:
+                jobs.append((username, os.path.join(source, name), default_role, None))
+        return jobs
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    with open(source, newline='') as f:
+        for row in csv.DictReader(f):
+            image_path = row['image'].strip()
+            if not os.path.isabs(image_path):
+                image_path = os.path.join(base_dir, image_path)
+            jobs.append((row['username'].strip(), image_path,
+                         (row.get('role') or default_role).strip().lower(),
+                         (row.get('password') or '').strip() or None))
+    return jobs
+
+def validate_job(username, role, seen):
+    """Same rules as the registration form; returns an error message or None
+
+    seen holds the lowercased usernames taken so far: like the users table,
+    names that differ only in case are duplicates.
+    """
+    # '_' separates the owner in secure file names (<username>_<name>.txt)
+    if ':' in username or '_' in username or len(username) < 3:
+        return "username must be at least 3 characters and cannot contain ':' or '_'"
+    if role not in VALID_ROLES:
+        return f"invalid role '{role}'"
+    if username.lower() in seen:
+        return "duplicate username in input"
+    return None
+
+def encode_image(job):
+    """Worker: compute the face encoding for one job (runs in a child process)"""
+    username, image_path, model, upsample = job
+    try:
+        image = face_recognition.load_image_file(image_path)
+        face_locations = face_recognition.face_locations(image, number_of_times_to_upsample=upsample,
+                                                         model=model)
+        if not face_locations:
+            return username, None, "no face found"
+        if len(face_locations) > 1:
+            # Enroll the largest face, like a single-person capture would
+            face_locations = [max(face_locations, key=lambda loc: (loc[2] - loc[0]) * (loc[1] - loc[3]))]
+        encodings = face_recognition.face_encodings(image, face_locations)
+        if not encodings:
+            return username, None, "could not encode face"
+        return username, encodings[0], None
+    except Exception as e:
+        return username, None, str(e)
+
+def read_journal(path):
+    """Latest state of every user a previous (possibly crashed) run got to, by username
+
+    Later lines update earlier ones, so a user keeps the fields of its
+    'pending' line (e.g. its image) after moving on to a later state.
+    """
+    journal = {}
+    if not os.path.exists(path):
+        return journal
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # torn last line from a crash
+            journal.setdefault(entry['username'], {}).update(entry)
+    return journal
+
+def append_journal(path, entries):
+    with open(path, 'a') as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+def read_passwords(path):
+    """One-time passwords generated by earlier runs, by username"""
+    passwords = {}
+    if not os.path.exists(path):
+        return passwords
+    with open(path, newline='') as f:
+        for row in csv.reader(f):
+            if len(row) == 2:
+                passwords[row[0]] = row[1]
+    return passwords
+
+def append_passwords(path, rows):
+    """Append (username, password) rows to a file only its owner can read"""
+    fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o600)
+    with os.fdopen(fd, 'r+b') as f:
+        size = f.seek(0, os.SEEK_END)
+        if size:
+            f.seek(size - 1)
+            torn = f.read(1) != b"\n"
+        else:
+            torn = False
+        lines = "".join(f"{username},{password}\n" for username, password in rows)
+        # A torn last row from a crash must not swallow the first new one
+        f.write((("\n" if torn else "") + lines).encode('utf-8'))
+        f.flush()
+        os.fsync(f.fileno())
+
+def enroll_batch(batch, journal_path, generated_passwords=(), registered=(), passwords_path=PASSWORD_FILE):
+    """Insert a batch of users in one transaction, then store face data for the new ones
+
+    batch holds (username, image_path, role, password, encoding) tuples;
+    registered holds usernames a crashed run already inserted. Every user
+    is journalled as 'pending' before the commit and 'registered' right
+    after it, so a rerun finishes users whose face data was never written
+    instead of reporting them as existing. Users that existed before keep
+    their face data untouched. Passwords generated here are saved to
+    passwords_path before the commit, never to the journal. Returns an
+    outcome entry per user.
+    """
+    generated = [(username, password) for username, _, _, password, _ in batch if username in generated_passwords]
+    if generated:
+        append_passwords(passwords_path, generated)
+    append_journal(journal_path, [{'username': username, 'image': image_path, 'status': 'pending'}
+                                  for username, image_path, _, _, _ in batch])
+
+    users = [(username, password, role, face_image_path(username))
+             for username, _, role, password, _ in batch]
+    result = register_users_to_db(users)
+    entries = []
+    if result is None:
+        for username, image_path, _, _, _ in batch:
+            entries.append({'username': username, 'image': image_path, 'status': 'failed',
+                            'error': "database error"})
+        # Left pending: database errors are retried on the next run
+        return entries
+
+    inserted = set(result[0])
+    append_journal(journal_path, [{'username': username, 'status': 'registered'} for username in result[0]])
+
+    finished = []
+    for username, image_path, _, password, encoding in batch:
+        # Ours: inserted now, inserted by a crashed run, or one that crashed between commit and journal
+        ours = username in inserted or username in registered or not has_embedding(username)
+        entry = {'username': username, 'image': image_path, 'status': 'enrolled' if ours else 'exists'}
+        if ours:
+            try:
+                stored_image_path = face_image_path(username)
+                if os.path.abspath(image_path) != os.path.abspath(stored_image_path):
+                    os.makedirs(os.path.dirname(stored_image_path), exist_ok=True)
+                    shutil.copyfile(image_path, stored_image_path)
+                save_embedding(username, encoding)
+            except OSError as e:
+                # Not finished in the journal, so the next run stores the face data again
+                entries.append({'username': username, 'image': image_path, 'status': 'failed',
+                                'error': f"could not store face data: {e}"})
+                continue
+        entries.append(entry)
+        finished.append(entry)
+    append_journal(journal_path, finished)
+    return entries
+
+def bulk_enroll(source, workers=None, batch_size=BATCH_SIZE, journal_path=JOURNAL_FILE,
+                default_role="user", model=DETECTION_MODEL, upsample=DETECTION_UPSAMPLE,
+                passwords_path=PASSWORD_FILE):
+    """Enroll every user in a directory or manifest; returns the per-user outcome entries"""
+    os.makedirs(FACE_DIR, exist_ok=True)
+    journal = read_journal(journal_path)
+    done = {username: entry for username, entry in journal.items() if entry['status'] in FINISHED_STATUSES}
+    registered = {username for username, entry in journal.items() if entry['status'] == 'registered'}
+    saved_passwords = read_passwords(passwords_path)
+    results = list(done.values())
+
+    pending = {}
+    generated_passwords = set()
+    seen = {username.lower() for username in done}
+    for username, image_path, role, password in load_jobs(source, default_role):
+        if username in done:
+            continue
+        error = validate_job(username, role, seen)
+        seen.add(username.lower())
+        if error:
+            results.append({'username': username, 'image': image_path, 'status': 'failed', 'error': error})
+            continue
+        # Users without a password in the manifest get a one-time password in passwords_path;
+        # an unfinished user keeps the one a crashed run may already have stored a hash of
+        if password is None:
+            password = saved_passwords.get(username) or secrets.token_urlsafe(9)
+            generated_passwords.add(username)
+        pending[username] = (image_path, role, password)
+
+    total = len(pending)
+    if journal:
+        print(f"↩️  Resuming: {len(done)} users already finished, {total} to go")
+    print(f"📦 Enrolling {total} users with {workers or os.cpu_count()} workers...")
+
+    started = last_report = time.perf_counter()
+    finished = failed = 0
+    batch = []
+    jobs = [(username, image_path, model, upsample) for username, (image_path, _, _) in pending.items()]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for username, encoding, error in executor.map(encode_image, jobs, chunksize=8):
+            image_path, role, password = pending[username]
+            if encoding is None:
+                results.append({'username': username, 'image': image_path, 'status': 'failed', 'error': error})
+                failed += 1
+                finished += 1
+            else:
+                batch.append((username, image_path, role, password, encoding))
+
+            if len(batch) >= batch_size:
+                entries = enroll_batch(batch, journal_path, generated_passwords, registered, passwords_path)
+                results.extend(entries)
+                failed += sum(entry['status'] == 'failed' for entry in entries)
+                finished += len(batch)
+                batch = []
+
+            now = time.perf_counter()
+            if now - last_report >= PROGRESS_INTERVAL:
+                rate = finished / (now - started)
+                print(f"📦 {finished}/{total} processed ({failed} failed) - {rate:.1f} users/s")
+                last_report = now
+
+    if batch:
+        entries = enroll_batch(batch, journal_path, generated_passwords, registered, passwords_path)
+        results.extend(entries)
+        failed += sum(entry['status'] == 'failed' for entry in entries)
+        finished += len(batch)
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ Bulk enrollment finished: {finished - failed} enrolled, {failed} failed in {elapsed:.1f}s")
+    return results
+
+def write_failure_report(results, path):
+    """Write username,image,error for every failed user as CSV"""
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['username', 'image', 'error'])
+        for entry in results:
+            if entry['status'] == 'failed':
+                writer.writerow([entry['username'], entry['image'], entry.get('error', '')])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Enroll many users from face images in parallel")
+    parser.add_argument("source", help="Directory of <username>.jpg images or CSV manifest "
+                                       "(username,image[,role][,password])")
+    parser.add_argument("--workers", type=int, default=None, help="Encoding processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--role", default="user", help="Role for users without one in the manifest")
+    parser.add_argument("--journal", default=JOURNAL_FILE, help="Progress journal used to resume")
+    parser.add_argument("--passwords", default=PASSWORD_FILE,
+                        help="Generated one-time passwords (created readable by its owner only)")
+    parser.add_argument("--report", default="bulk_enroll_failures.csv", help="Failure report CSV")
+    parser.add_argument("--model", choices=("hog", "cnn"), default=DETECTION_MODEL)
+    parser.add_argument("--upsample", type=int, default=DETECTION_UPSAMPLE)
+    options = parser.parse_args(argv)
+
+    results = bulk_enroll(options.source, options.workers, options.batch_size, options.journal,
+                          options.role.lower(), options.model, options.upsample, options.passwords)
+    write_failure_report(results, options.report)
+    print(f"📝 Failure report written to {options.report}")
+    if os.path.exists(options.passwords):
+        print(f"🔑 One-time passwords are in {options.passwords}; hand them out, then delete the file")
+
+if __name__ == "__main__":
+    main()
@@ -1,199 +1,855 @@
-import mysql.connector
-from mysql.connector import Error
-import hashlib
+from collections import OrderedDict
+from contextlib import closing, contextmanager
+from datetime import datetime, timedelta
+import atexit
+import os
+import queue
+import threading
+import time
+from db_backends import (
+    DATABASE_ERRORS,
+    INTEGRITY_ERRORS,
+    INSERT_ATTEMPT_QUERY,
+    SQLITE_PATH,
+    PoolError,
+    create_backend,
+)
+from login_throttle import LoginThrottle
+from password_hashing import get_password_hasher
+
+# "mysql" uses DB_CONFIG; "sqlite" uses an embedded database file at SQLITE_PATH (no server needed)
+DB_BACKEND = os.environ.get("SECURE_FS_DB_BACKEND", "mysql")
+
+DB_CONFIG = {
+    'host': 'localhost',
+    'database': 'secure_file_system',
+    'user': 'root',  # Change this to your MySQL username
+    'password': 'root'  # Change this to your MySQL password
+}
+
+POOL_SIZE = 5  # Maximum number of open connections per process
+POOL_ACQUIRE_TIMEOUT = 5.0  # Seconds to wait for a free connection
+POOL_HEALTH_CHECK_INTERVAL = 30.0  # Ping idle connections older than this before reuse
+
+AUDIT_QUEUE_SIZE = 10000  # Login attempts buffered in memory before backpressure kicks in
+AUDIT_BATCH_SIZE = 200  # Flush as soon as this many attempts are waiting
+AUDIT_FLUSH_INTERVAL = 1.0  # ...or at least this often (seconds)
+AUDIT_ENQUEUE_TIMEOUT = 0.05  # Longest a login may block on a full queue before the event is dropped
+
+USER_CACHE_SIZE = 1024  # User records kept in memory (least recently used are evicted)
+USER_CACHE_TTL = 30.0  # Seconds a cached record is trusted (bounds staleness across processes)
+USER_CACHE_NEGATIVE_TTL = 5.0  # Seconds "no such user" is remembered
+USER_LIST_CACHE_TTL = 10.0  # Seconds a page of the admin user listing is reused
+USER_LIST_CACHE_PAGES = 64  # Listing pages kept in memory
+USER_PAGE_SIZE = 100  # Users fetched per page of the admin listing
+
+RETENTION_DAYS = 90  # Raw login attempts older than this are rolled up into login_attempt_daily
+RETENTION_BATCH_SIZE = 5000  # Rows rolled up and deleted per transaction
+RETENTION_BATCH_PAUSE = 0.2  # Seconds between batches, so retention never hogs the database
+RETENTION_INTERVAL = 3600.0  # Seconds between background retention runs
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    """Return the configured storage backend (see DB_BACKEND)"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend(DB_BACKEND, DB_CONFIG, SQLITE_PATH)
+    return _backend
+
+def set_backend(backend):
+    """Switch every helper in this module to another backend (tests, benchmarks)
+
+    Closes the current connection pool and empties the user caches; call it
+    before starting the audit writer or retention job, or after closing them.
+    """
+    global _backend, _pool
+    with _backend_lock, _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+        _backend = backend
+    _user_cache.clear()
+    _user_list_cache.clear()
 
 def create_database_connection():
-    """Create connection to MySQL database"""
+    """Create connection to the configured database"""
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            database='secure_file_system',
-            user='root',  # Change this to your MySQL username
-            password='root'  # Change this to your MySQL password
-        )
+        connection = get_backend().connect()
         return connection
-    except Error as e:
-        print(f"Error connecting to MySQL: {e}")
+    except DATABASE_ERRORS as e:
+        print(f"Error connecting to database: {e}")
         return None
 
+class ConnectionPool:
+    """Size-bounded pool of reusable database connections"""
+
+    def __init__(self, backend, size=POOL_SIZE, acquire_timeout=POOL_ACQUIRE_TIMEOUT,
+                 health_check_interval=POOL_HEALTH_CHECK_INTERVAL):
+        self.backend = backend
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        # Idle connections with the time they were returned; LIFO keeps hot connections hot
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = False
+
+    def acquire(self, timeout=None):
+        """Check out a healthy connection, opening a new one if none are idle"""
+        if self._closed:
+            raise PoolError("Connection pool is closed")
+        if timeout is None:
+            timeout = self.acquire_timeout
+        if not self._slots.acquire(timeout=timeout):
+            raise PoolError(f"Timed out after {timeout}s waiting for a database connection")
+
+        try:
+            while True:
+                try:
+                    connection, idle_since = self._idle.get_nowait()
+                except queue.Empty:
+                    return self.backend.connect()
+                if self._is_healthy(connection, idle_since):
+                    return connection
+                self._discard(connection)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, connection, check=False):
+        """Return a connection to the pool, dropping it if it is broken"""
+        try:
+            # is_connected() costs a ping, so only verify connections that saw an error
+            if self._closed or (check and not self.backend.is_connected(connection)):
+                self._discard(connection)
+                return
+            # Never hand out a connection with an open transaction (only left by a failed write)
+            if connection.in_transaction:
+                connection.rollback()
+            self._idle.put((connection, time.monotonic()))
+        except DATABASE_ERRORS:
+            self._discard(connection)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Context manager that checks a connection out and always returns it"""
+        connection = self.acquire(timeout)
+        try:
+            yield connection
+        except BaseException:
+            self.release(connection, check=True)
+            raise
+        else:
+            self.release(connection)
+
+    def close(self):
+        """Close every idle connection and refuse further checkouts"""
+        self._closed = True
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(connection)
+
+    def _is_healthy(self, connection, idle_since):
+        # Only pay for a ping when the connection has been idle long enough to have timed out
+        if time.monotonic() - idle_since < self.health_check_interval:
+            return True
+        try:
+            self.backend.ping(connection)
+            return True
+        except DATABASE_ERRORS:
+            return False
+
+    @staticmethod
+    def _discard(connection):
+        try:
+            connection.close()
+        except DATABASE_ERRORS:
+            pass
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_connection_pool():
+    """Return the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(get_backend())
+                atexit.register(_pool.close)
+    return _pool
+
+def pooled_connection(timeout=None):
+    """Borrow a connection from the shared pool: `with pooled_connection() as connection:`"""
+    return get_connection_pool().connection(timeout)
+
+class UserCache:
+    """Thread-safe LRU cache whose entries also expire after a TTL
+
+    Writers invalidate keys explicitly, or update() them in place when
+    they know the new value. Both bump a version number: a loader takes
+    version() before its query and passes it to put(), which is dropped if
+    anything changed in between, so a slow read can never re-cache data
+    that a write just made stale.
+    """
+
+    MISSING = object()
+
+    def __init__(self, max_size=USER_CACHE_SIZE, ttl=USER_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self._version = 0
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'invalidations': 0}
+
+    def get(self, key):
+        """Cached value for key, or UserCache.MISSING"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return self.MISSING
+            value, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return self.MISSING
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def version(self):
+        with self._lock:
+            return self._version
+
+    def put(self, key, value, version=None, ttl=None):
+        """Cache a value loaded when version() returned version; False if it was already stale"""
+        with self._lock:
+            if version is not None and version != self._version:
+                return False
+            self._entries[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+            return True
+
+    def update(self, key, change):
+        """Replace a cached value with change(value), keeping its expiry; False if key is not cached"""
+        with self._lock:
+            self._version += 1
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() >= entry[1]:
+                return False
+            self._entries[key] = (change(entry[0]), entry[1])
+            return True
+
+    def invalidate(self, key):
+        with self._lock:
+            self._version += 1
+            self._stats['invalidations'] += 1
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+
+    def stats(self):
+        """Snapshot of the hit/miss counters plus the current size"""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['size'] = len(self._entries)
+        lookups = snapshot['hits'] + snapshot['misses']
+        snapshot['hit_rate'] = snapshot['hits'] / lookups if lookups else 0.0
+        return snapshot
+
+_user_cache = UserCache()
+_user_list_cache = UserCache(max_size=USER_LIST_CACHE_PAGES, ttl=USER_LIST_CACHE_TTL)
+
+def _user_key(username):
+    # Usernames are unique case-insensitively, so one cache entry serves every spelling
+    return username.lower()
+
+def invalidate_user(username):
+    """Drop a user's cached record (and every cached listing page) after a change"""
+    _user_cache.invalidate(_user_key(username))
+    _user_list_cache.clear()
+
+def _touch_last_login(username):
+    # Write a successful login through to the cached record instead of dropping it,
+    # so the next login of the same user is still served from the cache
+    now = datetime.now().replace(microsecond=0)
+    _user_cache.update(_user_key(username), lambda record: record and dict(record, last_login=now))
+    _user_list_cache.clear()
+
+def user_cache_stats():
+    """Hit/miss counters of the user record and user listing caches"""
+    return {'records': _user_cache.stats(), 'listing': _user_list_cache.stats()}
+
 def create_database_and_tables():
     """Create the database and required tables"""
     try:
-        # First connect without specifying database to create it
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='root',  # Change this to your MySQL username
-            password='root'  # Change this to your MySQL password
-        )
-        cursor = connection.cursor()
-        
-        # Create database if it doesn't exist
-        cursor.execute("CREATE DATABASE IF NOT EXISTS secure_file_system")
-        cursor.execute("USE secure_file_system")
-        
-        # Create users table
-        create_users_table = """
-        CREATE TABLE IF NOT EXISTS users (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            username VARCHAR(50) UNIQUE NOT NULL,
-            password_hash VARCHAR(64) NOT NULL,
-            role ENUM('admin', 'user') NOT NULL DEFAULT 'user',
-            face_image_path VARCHAR(255),
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            last_login TIMESTAMP NULL
-        )
-        """
-        cursor.execute(create_users_table)
-        
-        # Create login_attempts table for additional security
-        create_attempts_table = """
-        CREATE TABLE IF NOT EXISTS login_attempts (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            username VARCHAR(50),
-            attempt_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            success BOOLEAN DEFAULT FALSE,
-            ip_address VARCHAR(45)
-        )
-        """
-        cursor.execute(create_attempts_table)
-        
-        connection.commit()
+        get_backend().create_schema()
         print("✅ Database and tables created successfully!")
-        
-    except Error as e:
+    except DATABASE_ERRORS as e:
         print(f"❌ Error creating database: {e}")
-    finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
 
 def hash_password(password):
-    """Hash password using SHA-256"""
-    return hashlib.sha256(password.encode()).hexdigest()
+    """Hash password with a salted scrypt (encoded string carrying its parameters; see password_hashing.py)"""
+    return get_password_hasher().hash(password)
 
 def register_user_to_db(username, password, role, face_image_path):
     """Register a new user in the database"""
-    connection = create_database_connection()
-    if not connection:
-        return False
-        
     try:
-        cursor = connection.cursor()
+        # Hashed before borrowing a connection: the KDF is deliberately slow
         password_hash = hash_password(password)
+        with pooled_connection() as connection, closing(connection.cursor()) as cursor:
+            query = """
+            INSERT INTO users (username, password_hash, role, face_image_path)
+            VALUES (%s, %s, %s, %s)
+            """
+            cursor.execute(query, (username, password_hash, role, face_image_path))
+            connection.commit()
+            return True
         
-        query = """
-        INSERT INTO users (username, password_hash, role, face_image_path)
-        VALUES (%s, %s, %s, %s)
-        """
-        cursor.execute(query, (username, password_hash, role, face_image_path))
-        connection.commit()
-        return True
-        
-    except mysql.connector.IntegrityError:
+    except INTEGRITY_ERRORS:
         print("❌ User already exists!")
         return False
-    except Error as e:
+    except DATABASE_ERRORS as e:
         print(f"❌ Error registering user: {e}")
         return False
     finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
+        # Also clears a cached "no such user" from the duplicate check
+        invalidate_user(username)
 
-def verify_user_credentials(username, password):
-    """Verify user credentials against database"""
-    connection = create_database_connection()
-    if not connection:
-        return None
-        
+def register_users_to_db(users):
+    """Register many users in one transaction
+
+    users is a list of (username, password, role, face_image_path) tuples.
+    Returns (inserted, existing) username lists, or None on a database error.
+    Usernames compare case-insensitively, like the users table: a name whose
+    case-folded form is registered (or earlier in users) counts as existing.
+    Passwords of new users are hashed in parallel, without holding a connection.
+    """
+    if not users:
+        return [], []
     try:
-        cursor = connection.cursor()
-        password_hash = hash_password(password)
-        
+        usernames = [user[0] for user in users]
+        placeholders = ", ".join(["%s"] * len(usernames))
+        with pooled_connection() as connection, closing(connection.cursor()) as cursor:
+            cursor.execute(f"SELECT username FROM users WHERE username IN ({placeholders})", usernames)
+            taken = {row[0].lower() for row in cursor.fetchall()}
+
+        new_users, existing = [], []
+        for user in users:
+            if user[0].lower() in taken:
+                existing.append(user[0])
+            else:
+                taken.add(user[0].lower())
+                new_users.append(user)
+        password_hashes = get_password_hasher().hash_many([user[1] for user in new_users])
+        rows = [(username, password_hash, role, face_image_path)
+                for (username, _, role, face_image_path), password_hash in zip(new_users, password_hashes)]
+
+        with pooled_connection() as connection, closing(connection.cursor()) as cursor:
+            if rows:
+                query = """
+                INSERT INTO users (username, password_hash, role, face_image_path)
+                VALUES (%s, %s, %s, %s)
+                """
+                cursor.executemany(query, rows)
+            connection.commit()
+        return [row[0] for row in rows], existing
+
+    except DATABASE_ERRORS as e:
+        print(f"❌ Error registering users: {e}")
+        return None
+    finally:
+        for user in users:
+            invalidate_user(user[0])
+
+def get_user_record(username):
+    """Return a user's record (role, face path, password hash, timestamps) or None
+
+    Served from the user cache when possible; raises one of DATABASE_ERRORS
+    if the database has to be asked and fails.
+    """
+    key = _user_key(username)
+    record = _user_cache.get(key)
+    if record is not UserCache.MISSING:
+        return record
+
+    version = _user_cache.version()
+    with pooled_connection() as connection, closing(connection.cursor()) as cursor:
         query = """
-        SELECT username, role, face_image_path FROM users 
-        WHERE username = %s AND password_hash = %s
+        SELECT username, role, face_image_path, password_hash, created_at, last_login
+        FROM users WHERE username = %s
         """
-        cursor.execute(query, (username, password_hash))
+        cursor.execute(query, (username,))
         result = cursor.fetchone()
-        
-        if result:
+
+    if result is None:
+        _user_cache.put(key, None, version, ttl=USER_CACHE_NEGATIVE_TTL)
+        return None
+    record = {
+        'username': result[0],
+        'role': result[1],
+        'face_image_path': result[2],
+        'password_hash': result[3],
+        'created_at': result[4],
+        'last_login': result[5],
+    }
+    _user_cache.put(key, record, version)
+    return record
+
+def user_exists(username):
+    """True if a user with this name is registered (cached)"""
+    return get_user_record(username) is not None
+
+def list_users_page(after=None, limit=USER_PAGE_SIZE, role=None, prefix=None):
+    """Return one page of users, oldest first, and the cursor of the next page
+
+    Rows are (username, role, created_at, last_login). Pages are keyset
+    paginated on the indexed (created_at, id): pass the returned cursor as
+    after to get the following page; it is None on the last page. role and
+    username prefix are filtered by the database.
+    """
+    key = (after, limit, role, prefix)
+    page = _user_list_cache.get(key)
+    if page is not UserCache.MISSING:
+        return page
+
+    conditions, params = [], []
+    if after is not None:
+        conditions.append("(created_at > %s OR (created_at = %s AND id > %s))")
+        params += [after[0], after[0], after[1]]
+    if role:
+        conditions.append("role = %s")
+        params.append(role)
+    if prefix:
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        conditions.append(f"username LIKE %s{get_backend().like_escape}")
+        params.append(escaped + "%")
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f"""
+    SELECT id, username, role, created_at, last_login FROM users {where}
+    ORDER BY created_at, id LIMIT %s
+    """
+    # One extra row tells us whether there is a next page
+    params.append(limit + 1)
+
+    version = _user_list_cache.version()
+    with pooled_connection() as connection, closing(connection.cursor()) as cursor:
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = (rows[-1][3], rows[-1][0])
+    page = ([row[1:] for row in rows], next_cursor)
+    _user_list_cache.put(key, page, version)
+    return page
+
+def update_password_hash(username, old_hash, new_hash):
+    """Replace a user's password hash, unless it was changed since old_hash was read"""
+    try:
+        with pooled_connection() as connection, closing(connection.cursor()) as cursor:
+            query = "UPDATE users SET password_hash = %s WHERE username = %s AND password_hash = %s"
+            cursor.execute(query, (new_hash, username, old_hash))
+            connection.commit()
+            return cursor.rowcount == 1
+
+    except DATABASE_ERRORS as e:
+        print(f"❌ Error updating password hash: {e}")
+        return False
+    finally:
+        invalidate_user(username)
+
+def verify_user_credentials(username, password):
+    """Verify user credentials against database
+
+    A correct password whose stored hash is outdated (legacy SHA-256, an
+    older version or a lower cost) is rehashed with the current parameters.
+    """
+    try:
+        hasher = get_password_hasher()
+        record = get_user_record(username)
+        if record is None:
+            hasher.verify_missing(password)
+            return None
+        if hasher.verify(password, record['password_hash']):
+            if hasher.needs_rehash(record['password_hash']):
+                update_password_hash(username, record['password_hash'], hasher.hash(password))
             return {
-                'username': result[0],
-                'role': result[1],
-                'face_image_path': result[2]
+                'username': record['username'],
+                'role': record['role'],
+                'face_image_path': record['face_image_path']
             }
         return None
         
-    except Error as e:
+    except DATABASE_ERRORS as e:
         print(f"❌ Error verifying credentials: {e}")
         return None
+
+def complete_login(username, success, ip_address="127.0.0.1"):
+    """Record the outcome of a login: attempt row plus last-login update, in one transaction
+
+    On MySQL this is one call to the record_login stored procedure, so the
+    whole write is a single round trip on one connection (databases set up
+    before the procedure existed run the two statements instead). A success
+    also updates the cached user record, so the credential check of the
+    user's next login needs no query and that login costs this round trip only.
+    Returns True if the outcome was stored.
+    """
+    try:
+        with pooled_connection() as connection, closing(connection.cursor()) as cursor:
+            get_backend().record_login(connection, cursor, username, success, ip_address)
+        return True
+
+    except DATABASE_ERRORS as e:
+        print(f"❌ Error recording login: {e}")
+        return False
     finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
+        if success:
+            _touch_last_login(username)
+        _record_throttle(username, success, ip_address)
 
 def update_last_login(username):
     """Update last login timestamp"""
-    connection = create_database_connection()
-    if not connection:
-        return
-        
     try:
-        cursor = connection.cursor()
-        query = "UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE username = %s"
-        cursor.execute(query, (username,))
-        connection.commit()
+        with pooled_connection() as connection, closing(connection.cursor()) as cursor:
+            query = f"UPDATE users SET last_login = {get_backend().now_sql} WHERE username = %s"
+            cursor.execute(query, (username,))
+            connection.commit()
         
-    except Error as e:
+    except DATABASE_ERRORS as e:
         print(f"❌ Error updating last login: {e}")
     finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
+        _touch_last_login(username)
+
+class LoginAuditWriter:
+    """Background writer that batches login attempts into multi-row INSERTs"""
+
+    INSERT_QUERY = INSERT_ATTEMPT_QUERY
+
+    def __init__(self, queue_size=AUDIT_QUEUE_SIZE, batch_size=AUDIT_BATCH_SIZE,
+                 flush_interval=AUDIT_FLUSH_INTERVAL, enqueue_timeout=AUDIT_ENQUEUE_TIMEOUT):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self._queue = queue.Queue(maxsize=queue_size)
+        # Rows taken off the queue but not yet committed (kept across failed flushes)
+        self._pending = []
+        self._flush_requested = threading.Event()
+        self._stopping = threading.Event()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'enqueued': 0,
+            'written': 0,
+            'dropped': 0,  # queue stayed full past enqueue_timeout, or closed writer
+            'delayed': 0,  # caller had to wait for queue space (backpressure)
+            'failed_flushes': 0,
+            'batches': 0,
+        }
+        self._thread = threading.Thread(target=self._run, name="login-audit-writer", daemon=True)
+        self._thread.start()
+
+    def record(self, username, success=False, ip_address="127.0.0.1"):
+        """Queue one login attempt; returns False if it had to be dropped"""
+        if self._stopping.is_set():
+            self._count('dropped')
+            return False
+
+        row = (username, datetime.now(), bool(success), ip_address)
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            # Backpressure: wake the writer and give it a moment to make room
+            self._count('delayed')
+            self._flush_requested.set()
+            try:
+                self._queue.put(row, timeout=self.enqueue_timeout)
+            except queue.Full:
+                self._count('dropped')
+                return False
+
+        self._count('enqueued')
+        if self._queue.qsize() >= self.batch_size:
+            self._flush_requested.set()
+        return True
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far has been handed to the database"""
+        self._flush_requested.set()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks or self._pending:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self, timeout=10.0):
+        """Stop accepting attempts and flush everything still buffered"""
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        self._flush_requested.set()
+        self._thread.join(timeout)
+
+    def stats(self):
+        """Snapshot of writer counters plus the current queue depth"""
+        with self._stats_lock:
+            snapshot = dict(self._stats)
+        snapshot['queued'] = self._queue.qsize() + len(self._pending)
+        return snapshot
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def _run(self):
+        while True:
+            self._flush_requested.wait(self.flush_interval)
+            self._flush_requested.clear()
+            stopping = self._stopping.is_set()
+
+            self._drain()
+            if stopping:
+                # Final flush; one retry so a transient error does not lose the tail
+                if self._pending and not self._write_pending():
+                    self._write_pending()
+                if self._pending:
+                    self._count('dropped', len(self._pending))
+                    print(f"❌ Dropped {len(self._pending)} login attempts on shutdown")
+                    self._pending = []
+                return
+
+    def _drain(self):
+        while True:
+            while len(self._pending) < self.batch_size:
+                try:
+                    self._pending.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+                self._queue.task_done()
+            if not self._pending or not self._write_pending():
+                return
+            if self._queue.empty():
+                return
+
+    def _write_pending(self):
+        batch = self._pending[:self.batch_size]
+        try:
+            with pooled_connection() as connection, closing(connection.cursor()) as cursor:
+                # executemany turns this into a single multi-row INSERT
+                cursor.executemany(self.INSERT_QUERY, batch)
+                connection.commit()
+        except DATABASE_ERRORS as e:
+            self._count('failed_flushes')
+            print(f"❌ Error logging attempts: {e}")
+            return False
+
+        del self._pending[:len(batch)]
+        self._count('written', len(batch))
+        self._count('batches')
+        return True
+
+_audit_writer = None
+_audit_writer_lock = threading.Lock()
+
+def get_audit_writer():
+    """Return the process-wide login audit writer, starting it on first use"""
+    global _audit_writer
+    if _audit_writer is None:
+        with _audit_writer_lock:
+            if _audit_writer is None:
+                # Create the pool first so atexit closes the writer (flushing it) before the pool
+                get_connection_pool()
+                _audit_writer = LoginAuditWriter()
+                atexit.register(_audit_writer.close)
+    return _audit_writer
 
 def log_login_attempt(username, success=False, ip_address="127.0.0.1"):
-    """Log login attempt for security monitoring"""
-    connection = create_database_connection()
-    if not connection:
-        return
-        
+    """Log login attempt for security monitoring (buffered, written in the background)"""
+    _record_throttle(username, success, ip_address)
+    return get_audit_writer().record(username, success, ip_address)
+
+_login_throttle = None
+_login_throttle_lock = threading.Lock()
+
+def get_login_throttle():
+    """Return the process-wide failed-login throttle (in memory; see seed_login_throttle)"""
+    global _login_throttle
+    if _login_throttle is None:
+        with _login_throttle_lock:
+            if _login_throttle is None:
+                _login_throttle = LoginThrottle()
+    return _login_throttle
+
+def _record_throttle(username, success, ip_address):
+    if success:
+        get_login_throttle().record_success(username, ip_address)
+    else:
+        get_login_throttle().record_failure(username, ip_address)
+
+def seed_login_throttle():
+    """Load the attempts inside the throttle window from login_attempts, so limits survive a restart
+
+    One range scan on the attempt_time index; returns the number of
+    attempts replayed, or None on a database error (the throttle then
+    starts empty).
+    """
+    throttle = get_login_throttle()
+    since = datetime.now() - timedelta(seconds=throttle.window)
+    query = """
+    SELECT username, ip_address, attempt_time, success FROM login_attempts
+    WHERE attempt_time >= %s ORDER BY attempt_time
+    """
     try:
-        cursor = connection.cursor()
-        query = """
-        INSERT INTO login_attempts (username, success, ip_address)
-        VALUES (%s, %s, %s)
-        """
-        cursor.execute(query, (username, success, ip_address))
-        connection.commit()
-        
-    except Error as e:
-        print(f"❌ Error logging attempt: {e}")
-    finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
+        with pooled_connection() as connection, closing(connection.cursor()) as cursor:
+            cursor.execute(query, (since,))
+            count = throttle.seed(cursor.fetchall())
+    except DATABASE_ERRORS as e:
+        print(f"❌ Error seeding login throttle: {e}")
+        return None
+
+    print(f"✅ Login throttle seeded with {count} recent attempts")
+    return count
+
+class LoginAttemptRetention:
+    """Background job that rolls old login attempts into daily totals and deletes them
+
+    Each batch claims up to batch_size old rows (with FOR UPDATE SKIP LOCKED
+    on MySQL), adds them to login_attempt_daily and deletes them in the
+    same transaction, so every attempt is counted exactly once even if
+    several processes run the job. Batches are small and spaced out, keeping lock
+    times and replication lag short while the raw table stays bounded.
+    """
+
+    SELECT_BATCH = """
+    SELECT id FROM login_attempts WHERE attempt_time < %s
+    ORDER BY attempt_time LIMIT %s
+    """
+
+    def __init__(self, retention_days=RETENTION_DAYS, batch_size=RETENTION_BATCH_SIZE,
+                 batch_pause=RETENTION_BATCH_PAUSE, interval=RETENTION_INTERVAL):
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.interval = interval
+        self._stopping = threading.Event()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._stats = {'runs': 0, 'rows_rolled_up': 0, 'batches': 0, 'failed_batches': 0}
+
+    def start(self):
+        """Run the job every interval seconds on a daemon thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="login-retention", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=10.0):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run_once(self):
+        """Roll up everything older than the retention window; returns rows processed"""
+        cutoff = datetime.now() - timedelta(days=self.retention_days)
+        total = 0
+        while not self._stopping.is_set():
+            processed = self._process_batch(cutoff)
+            if processed is None:
+                break
+            total += processed
+            if processed < self.batch_size:
+                break
+            self._stopping.wait(self.batch_pause)
+        self._count('runs')
+        if total:
+            print(f"✅ Rolled up {total} login attempts older than {self.retention_days} days")
+        return total
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def _process_batch(self, cutoff):
+        backend = get_backend()
+        try:
+            with pooled_connection() as connection, closing(connection.cursor()) as cursor:
+                backend.begin(connection)
+                cursor.execute(self.SELECT_BATCH + backend.lock_rows, (cutoff, self.batch_size))
+                ids = [row[0] for row in cursor.fetchall()]
+                if ids:
+                    placeholders = ", ".join(["%s"] * len(ids))
+                    cursor.execute(backend.rollup_query.format(ids=placeholders), ids)
+                    cursor.execute(f"DELETE FROM login_attempts WHERE id IN ({placeholders})", ids)
+                connection.commit()
+        except DATABASE_ERRORS as e:
+            self._count('failed_batches')
+            print(f"❌ Error rolling up login attempts: {e}")
+            return None
+
+        if ids:
+            self._count('batches')
+            self._count('rows_rolled_up', len(ids))
+        return len(ids)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self.run_once()
+            self._stopping.wait(self.interval)
+
+_retention_job = None
+_retention_job_lock = threading.Lock()
+
+def start_login_retention():
+    """Start the process-wide login attempt retention job (once) and return it"""
+    global _retention_job
+    if _retention_job is None:
+        with _retention_job_lock:
+            if _retention_job is None:
+                # Create the pool first so atexit stops the job before closing the pool
+                get_connection_pool()
+                _retention_job = LoginAttemptRetention()
+                _retention_job.start()
+                atexit.register(_retention_job.stop)
+    return _retention_job
+
 def delete_user_from_db(username):
     """Delete user and related data from database"""
-    connection = create_database_connection()
-    if not connection:
-        return False
-
     try:
-        cursor = connection.cursor()
-        query = "DELETE FROM users WHERE username = %s"
-        cursor.execute(query, (username,))
-        connection.commit()
+        with pooled_connection() as connection, closing(connection.cursor()) as cursor:
+            query = "DELETE FROM users WHERE username = %s"
+            cursor.execute(query, (username,))
+            connection.commit()
+        invalidate_user(username)
+        # A deleted user must never come back as a 1:N identification candidate
+        from face_store import forget_user
+        forget_user(username)
         print(f"✅ User '{username}' deleted from DB")
         return True
-    except Error as e:
+    except DATABASE_ERRORS as e:
         print(f"❌ Error deleting user: {e}")
         return False
-    finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
-
 
 if __name__ == "__main__":
     # Run this script first to set up the database
@@ -0,0 +1,329 @@
+import sqlite3
+from contextlib import closing
+from datetime import date, datetime
+
+try:
+    import mysql.connector
+    from mysql.connector import errorcode
+except ImportError:  # SQLite-only installs (CI, load tests) don't need the MySQL driver
+    mysql = None
+
+SQLITE_PATH = "secure_file_system.db"  # Database file used by the SQLite backend
+SQLITE_BUSY_TIMEOUT = 5.0  # Seconds a writer waits for another connection's write lock
+
+class PoolError(Exception):
+    """No database connection could be checked out"""
+
+# Catch these instead of a driver's own Error so code works on every backend
+DATABASE_ERRORS = (PoolError, sqlite3.Error) + ((mysql.connector.Error,) if mysql else ())
+INTEGRITY_ERRORS = (sqlite3.IntegrityError,) + ((mysql.connector.IntegrityError,) if mysql else ())
+
+INSERT_ATTEMPT_QUERY = """
+INSERT INTO login_attempts (username, attempt_time, success, ip_address)
+VALUES (%s, %s, %s, %s)
+"""
+
+class StorageBackend:
+    """Database engine behind database_setup
+
+    Connections follow DB-API with %s placeholders and expose
+    in_transaction; everything engine-specific (schema, SQL dialect
+    fragments, connection health) lives on the backend. A read never
+    leaves a transaction open, so returning a connection to the pool costs
+    nothing; writes of more than one statement call begin() first.
+    """
+
+    name = None
+    now_sql = "CURRENT_TIMESTAMP"  # Current local time as an SQL expression
+    like_escape = ""  # Clause that makes backslash the LIKE escape character
+    lock_rows = ""  # SELECT suffix that locks the rows for this transaction, skipping locked ones
+    rollup_query = None  # Upsert of login_attempts rows ({ids}) into login_attempt_daily
+
+    def connect(self):
+        raise NotImplementedError
+
+    def begin(self, connection):
+        """Start an explicit transaction (a no-op where the driver opens one at the first write)"""
+
+    def ping(self, connection):
+        """Raise one of DATABASE_ERRORS if the connection is no longer usable"""
+        raise NotImplementedError
+
+    def is_connected(self, connection):
+        try:
+            self.ping(connection)
+            return True
+        except DATABASE_ERRORS:
+            return False
+
+    def create_schema(self):
+        """Create the database objects if they don't exist yet (safe to rerun)"""
+        raise NotImplementedError
+
+    def record_login(self, connection, cursor, username, success, ip_address):
+        """Update last_login (on success) and insert the attempt, then commit"""
+        self.begin(connection)
+        if success:
+            cursor.execute(f"UPDATE users SET last_login = {self.now_sql} WHERE username = %s", (username,))
+        cursor.execute(INSERT_ATTEMPT_QUERY, (username, datetime.now(), bool(success), ip_address))
+        connection.commit()
+
+class MySQLBackend(StorageBackend):
+    """MySQL server via mysql-connector-python"""
+
+    name = "mysql"
+    lock_rows = " FOR UPDATE SKIP LOCKED"
+    rollup_query = """
+    INSERT INTO login_attempt_daily (username, day, successes, failures, first_attempt, last_attempt)
+    SELECT COALESCE(username, ''), DATE(attempt_time), SUM(success = TRUE), SUM(NOT (success <=> TRUE)),
+           MIN(attempt_time), MAX(attempt_time)
+    FROM login_attempts WHERE id IN ({ids})
+    GROUP BY COALESCE(username, ''), DATE(attempt_time)
+    ON DUPLICATE KEY UPDATE
+        successes = successes + VALUES(successes),
+        failures = failures + VALUES(failures),
+        first_attempt = LEAST(COALESCE(first_attempt, VALUES(first_attempt)), VALUES(first_attempt)),
+        last_attempt = GREATEST(COALESCE(last_attempt, VALUES(last_attempt)), VALUES(last_attempt))
+    """
+
+    # Keyset pagination walks (created_at, id); the role index also serves role-filtered pages
+    USER_INDEXES = [
+        "CREATE INDEX idx_users_created ON users (created_at, id)",
+        "CREATE INDEX idx_users_role_created ON users (role, created_at, id)",
+    ]
+    # Per-user history and time-range scans (including retention) over login_attempts
+    LOGIN_ATTEMPT_INDEXES = [
+        "CREATE INDEX idx_attempts_user_time ON login_attempts (username, attempt_time)",
+        "CREATE INDEX idx_attempts_time ON login_attempts (attempt_time)",
+    ]
+
+    def __init__(self, config):
+        self.config = dict(config)
+
+    def connect(self, use_database=True):
+        if mysql is None:
+            raise ImportError("The MySQL backend needs mysql-connector-python (pip install mysql-connector-python)")
+        config = self.config if use_database else {k: v for k, v in self.config.items() if k != 'database'}
+        # Autocommit, so a SELECT does not open a transaction the pool has to roll back on release
+        return mysql.connector.connect(**dict(config, autocommit=True))
+
+    def begin(self, connection):
+        connection.start_transaction()
+
+    def ping(self, connection):
+        connection.ping(reconnect=False)
+
+    def is_connected(self, connection):
+        return connection.is_connected()
+
+    def record_login(self, connection, cursor, username, success, ip_address):
+        try:
+            # One round trip: the procedure updates, inserts and commits server-side
+            cursor.execute("CALL record_login(%s, %s, %s)", (username, bool(success), ip_address))
+        except mysql.connector.Error as e:
+            if e.errno != errorcode.ER_SP_DOES_NOT_EXIST:
+                raise
+            print("❌ record_login procedure missing; run database_setup.py to create it")
+            super().record_login(connection, cursor, username, success, ip_address)
+
+    def create_schema(self):
+        database = self.config['database']
+        # First connect without specifying database to create it
+        with closing(self.connect(use_database=False)) as connection, closing(connection.cursor()) as cursor:
+            # Create database if it doesn't exist
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{database}`")
+            cursor.execute(f"USE `{database}`")
+
+            # Create users table
+            create_users_table = """
+            CREATE TABLE IF NOT EXISTS users (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                username VARCHAR(50) UNIQUE NOT NULL,
+                password_hash VARCHAR(255) NOT NULL,
+                role ENUM('admin', 'user') NOT NULL DEFAULT 'user',
+                face_image_path VARCHAR(255),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_login TIMESTAMP NULL
+            )
+            """
+            cursor.execute(create_users_table)
+            # Databases created before salted hashes stored 64-character SHA-256 digests
+            cursor.execute("ALTER TABLE users MODIFY password_hash VARCHAR(255) NOT NULL")
+            self._create_indexes(cursor, self.USER_INDEXES)
+
+            # Create login_attempts table for additional security
+            create_attempts_table = """
+            CREATE TABLE IF NOT EXISTS login_attempts (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                username VARCHAR(50),
+                attempt_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                success BOOLEAN DEFAULT FALSE,
+                ip_address VARCHAR(45)
+            )
+            """
+            cursor.execute(create_attempts_table)
+            self._create_indexes(cursor, self.LOGIN_ATTEMPT_INDEXES)
+
+            # Per-user, per-day totals of attempts that aged out of login_attempts
+            create_daily_table = """
+            CREATE TABLE IF NOT EXISTS login_attempt_daily (
+                username VARCHAR(50) NOT NULL,
+                day DATE NOT NULL,
+                successes INT NOT NULL DEFAULT 0,
+                failures INT NOT NULL DEFAULT 0,
+                first_attempt TIMESTAMP NULL,
+                last_attempt TIMESTAMP NULL,
+                PRIMARY KEY (username, day),
+                INDEX idx_daily_day (day)
+            )
+            """
+            cursor.execute(create_daily_table)
+
+            # Records a finished login (last-login update + attempt row) in one round trip
+            cursor.execute("DROP PROCEDURE IF EXISTS record_login")
+            create_record_login = """
+            CREATE PROCEDURE record_login(IN p_username VARCHAR(50), IN p_success BOOLEAN,
+                                          IN p_ip_address VARCHAR(45))
+            BEGIN
+                DECLARE EXIT HANDLER FOR SQLEXCEPTION
+                BEGIN
+                    ROLLBACK;
+                    RESIGNAL;
+                END;
+                START TRANSACTION;
+                IF p_success THEN
+                    UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE username = p_username;
+                END IF;
+                INSERT INTO login_attempts (username, attempt_time, success, ip_address)
+                VALUES (p_username, CURRENT_TIMESTAMP, p_success, p_ip_address);
+                COMMIT;
+            END
+            """
+            cursor.execute(create_record_login)
+            connection.commit()
+
+    @staticmethod
+    def _create_indexes(cursor, statements):
+        # MySQL has no CREATE INDEX IF NOT EXISTS
+        for statement in statements:
+            try:
+                cursor.execute(statement)
+            except mysql.connector.Error as e:
+                if e.errno != errorcode.ER_DUP_KEYNAME:
+                    raise
+
+# SQLite has no date types: store datetimes as ISO text (second precision, like MySQL
+# TIMESTAMP) and turn TIMESTAMP/DATE columns back into datetime/date objects on read
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" ", "seconds"))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_converter("TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter("DATE", lambda value: date.fromisoformat(value.decode()))
+
+class SQLiteCursor(sqlite3.Cursor):
+    """sqlite3 cursor that accepts the %s placeholders used by the MySQL queries"""
+
+    def execute(self, sql, parameters=()):
+        return super().execute(sql.replace("%s", "?"), parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return super().executemany(sql.replace("%s", "?"), seq_of_parameters)
+
+class SQLiteConnection(sqlite3.Connection):
+    def cursor(self, factory=SQLiteCursor):
+        return super().cursor(factory)
+
+class SQLiteBackend(StorageBackend):
+    """Embedded SQLite database file in WAL mode (no server needed)
+
+    Mirrors the MySQL schema and semantics: usernames compare
+    case-insensitively like MySQL's default collation, timestamps are local
+    time with second precision, and LIKE escapes with backslash. Use a
+    file path; every pooled connection to ":memory:" would get its own
+    empty database.
+    """
+
+    name = "sqlite"
+    now_sql = "datetime('now', 'localtime')"
+    like_escape = " ESCAPE '\\'"
+    # Writers are serialized by SQLite and the rollup re-reads the rows inside the write
+    # transaction, so no row locking is needed
+    rollup_query = """
+    INSERT INTO login_attempt_daily (username, day, successes, failures, first_attempt, last_attempt)
+    SELECT COALESCE(username, ''), DATE(attempt_time), SUM(success IS 1), SUM(success IS NOT 1),
+           MIN(attempt_time), MAX(attempt_time)
+    FROM login_attempts WHERE id IN ({ids})
+    GROUP BY COALESCE(username, ''), DATE(attempt_time)
+    ON CONFLICT (username, day) DO UPDATE SET
+        successes = successes + excluded.successes,
+        failures = failures + excluded.failures,
+        first_attempt = MIN(COALESCE(first_attempt, excluded.first_attempt), excluded.first_attempt),
+        last_attempt = MAX(COALESCE(last_attempt, excluded.last_attempt), excluded.last_attempt)
+    """
+
+    SCHEMA = [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username VARCHAR(50) UNIQUE NOT NULL COLLATE NOCASE,
+            password_hash VARCHAR(255) NOT NULL,
+            role TEXT NOT NULL DEFAULT 'user' CHECK (role IN ('admin', 'user')),
+            face_image_path VARCHAR(255),
+            created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+            last_login TIMESTAMP NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_users_created ON users (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_users_role_created ON users (role, created_at, id)",
+        """
+        CREATE TABLE IF NOT EXISTS login_attempts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username VARCHAR(50) COLLATE NOCASE,
+            attempt_time TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+            success BOOLEAN DEFAULT FALSE,
+            ip_address VARCHAR(45)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_attempts_user_time ON login_attempts (username, attempt_time)",
+        "CREATE INDEX IF NOT EXISTS idx_attempts_time ON login_attempts (attempt_time)",
+        """
+        CREATE TABLE IF NOT EXISTS login_attempt_daily (
+            username VARCHAR(50) NOT NULL COLLATE NOCASE,
+            day DATE NOT NULL,
+            successes INT NOT NULL DEFAULT 0,
+            failures INT NOT NULL DEFAULT 0,
+            first_attempt TIMESTAMP NULL,
+            last_attempt TIMESTAMP NULL,
+            PRIMARY KEY (username, day)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_daily_day ON login_attempt_daily (day)",
+    ]
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+
+    def connect(self):
+        # Pooled connections are handed between threads, but only ever used by one at a time
+        connection = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT, factory=SQLiteConnection,
+                                     detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        # WAL lets readers run alongside the single writer; NORMAL sync is durable across app crashes
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def ping(self, connection):
+        connection.execute("SELECT 1")
+
+    def create_schema(self):
+        with closing(self.connect()) as connection:
+            for statement in self.SCHEMA:
+                connection.execute(statement)
+            connection.commit()
+
+def create_backend(name, mysql_config=None, sqlite_path=SQLITE_PATH):
+    """Backend for a name from configuration ("mysql" or "sqlite")"""
+    if name == "mysql":
+        return MySQLBackend(mysql_config)
+    if name == "sqlite":
+        return SQLiteBackend(sqlite_path)
+    raise ValueError(f"Unknown database backend: {name}")
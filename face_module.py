@@ -1,10 +1,157 @@
 import cv2
 import face_recognition
+import atexit
 import os
+import threading
+import time
 import numpy as np
-from PIL import Image
+from face_store import (FACE_DIR, save_embedding, save_templates, load_templates, add_template,
+                        delete_embedding, has_embedding, list_embedded_usernames, face_image_path,
+                        identify, MAX_TEMPLATES)
 
-FACE_DIR = "face_data"
+CAMERA_INDEX = 0
+CAMERA_WIDTH = 640  # Requested capture resolution (None keeps the driver default)
+CAMERA_HEIGHT = 480
+CAMERA_FPS = 30
+CAMERA_IDLE_TIMEOUT = 60.0  # Release the device after this many seconds without use
+CAMERA_WARM_UP_FRAMES = 10  # Max reads on open until the sensor delivers a frame
+CAMERA_FLUSH_FRAMES = 2  # Stale buffered frames to discard when reusing a warm camera
+
+MAX_VERIFICATION_ATTEMPTS = 100  # Frames to check before giving up
+VERIFICATION_THRESHOLD = 0.6  # Face recognition confidence threshold
+
+ENROLLMENT_TEMPLATES = 3  # Templates collected per user at enrollment (capped by MAX_TEMPLATES)
+ENROLLMENT_EXTRA_SECONDS = 3.0  # Time allowed to collect the extra templates after 's'
+TEMPLATE_MIN_DIVERSITY = 0.08  # A new template must be at least this far from the existing ones
+TEMPLATE_UPDATE_DISTANCE = 0.35  # Only matches this confident may add a template on login
+
+DETECTION_SCALE = 0.5  # Detect on a frame resized by this factor, boxes are mapped back
+DETECTION_MODEL = "hog"  # "hog" (fast, CPU) or "cnn" (accurate, wants a GPU)
+DETECTION_UPSAMPLE = 1  # Times to upsample the (downscaled) image when looking for faces
+DETECTION_ROI_MARGIN = None  # e.g. 0.5 to search only around the last face (box size fraction per side)
+DETECTION_MODELS = ("hog", "cnn")
+
+TRACKING_DETECT_INTERVAL = 5  # Run full detection at least every N frames when tracking
+TRACKING_MIN_CONFIDENCE = 0.6  # Re-detect as soon as the template match score drops below this
+TRACKING_SEARCH_MARGIN = 0.5  # Search window around the last box (box size fraction per side)
+TRACKING_TEMPLATE_SIZE = 48  # Face template width in pixels; tracking runs at this scale
+
+QUALITY_MIN_FACE_SIZE = 80  # Minimum face box height in pixels worth encoding
+QUALITY_MIN_SHARPNESS = 60.0  # Minimum variance of the Laplacian over the face (blur check)
+QUALITY_BRIGHTNESS_RANGE = (50, 210)  # Acceptable mean gray level of the face
+QUALITY_MAX_YAW = 0.35  # Max nose offset from the eye midpoint, as a fraction of eye distance
+
+# Sequential (SPRT-style) decision over per-frame distances
+VOTING_GENUINE_MEAN = 0.40  # Typical distance for the enrolled user
+VOTING_IMPOSTOR_MEAN = 0.75  # Typical distance for someone else
+VOTING_SIGMA = 0.10  # Spread of both distance distributions
+VOTING_FALSE_ACCEPT_RATE = 0.001
+VOTING_FALSE_REJECT_RATE = 0.01
+VOTING_MAX_FRAME_EVIDENCE = 4.0  # Cap per-frame evidence so no single frame decides alone
+
+class CameraManager:
+    """Keeps one camera handle open and warm across enrollment and verification
+
+    acquire() opens the device on first use (applying the configured
+    resolution and FPS) and returns the shared cv2.VideoCapture; release()
+    starts an idle timer that closes the device if nobody acquires it again
+    within idle_timeout seconds.
+    """
+
+    def __init__(self, index=CAMERA_INDEX, width=CAMERA_WIDTH, height=CAMERA_HEIGHT,
+                 fps=CAMERA_FPS, idle_timeout=CAMERA_IDLE_TIMEOUT):
+        self.index = index
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.idle_timeout = idle_timeout
+        self._cam = None
+        self._users = 0
+        self._idle_timer = None
+        self._lock = threading.RLock()
+
+    def acquire(self):
+        """Return the open camera, or None if it cannot be opened"""
+        with self._lock:
+            self._cancel_idle_timer()
+            if self._cam is None or not self._cam.isOpened():
+                if not self._open():
+                    return None
+            elif self._users == 0:
+                # Drop frames that sat in the driver buffer while we were idle
+                for _ in range(CAMERA_FLUSH_FRAMES):
+                    self._cam.grab()
+            self._users += 1
+            return self._cam
+
+    def release(self):
+        """Give the camera back; it is closed after idle_timeout without use"""
+        with self._lock:
+            self._users = max(0, self._users - 1)
+            if self._users == 0 and self._cam is not None:
+                if self.idle_timeout is None or self.idle_timeout <= 0:
+                    self._close()
+                else:
+                    self._idle_timer = threading.Timer(self.idle_timeout, self._close_if_idle)
+                    self._idle_timer.daemon = True
+                    self._idle_timer.start()
+
+    def close(self):
+        """Release the device now"""
+        with self._lock:
+            self._cancel_idle_timer()
+            self._close()
+
+    def is_open(self):
+        with self._lock:
+            return self._cam is not None
+
+    def _open(self):
+        cam = cv2.VideoCapture(self.index)
+        if not cam.isOpened():
+            cam.release()
+            return False
+        if self.width and self.height:
+            cam.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+            cam.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        if self.fps:
+            cam.set(cv2.CAP_PROP_FPS, self.fps)
+        # Read until the sensor produces frames instead of sleeping a fixed time
+        for _ in range(CAMERA_WARM_UP_FRAMES):
+            ret, _ = cam.read()
+            if ret:
+                break
+        self._cam = cam
+        return True
+
+    def _close(self):
+        if self._cam is not None:
+            self._cam.release()
+            self._cam = None
+            self._users = 0
+
+    def _close_if_idle(self):
+        with self._lock:
+            if self._users == 0:
+                self._close()
+
+    def _cancel_idle_timer(self):
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+
+_camera_manager = None
+_camera_manager_lock = threading.Lock()
+
+def get_camera_manager():
+    """Return the process-wide camera manager"""
+    global _camera_manager
+    if _camera_manager is None:
+        with _camera_manager_lock:
+            if _camera_manager is None:
+                _camera_manager = CameraManager()
+                atexit.register(_camera_manager.close)
+    return _camera_manager
 
 def ensure_face_directory():
     """Ensure face data directory exists"""
@@ -12,17 +159,188 @@ def ensure_face_directory():
         os.makedirs(FACE_DIR)
         print(f"✅ Created face data directory: {FACE_DIR}")
 
-def capture_face(username):
-    """Capture and save user's face image"""
+class FaceDetector:
+    """Configurable face detection front-end
+
+    Runs detection on a downscaled copy of the frame (optionally only in a
+    region around the last face found) and maps the boxes back to full
+    resolution, so encoding still sees full-resolution faces.
+    """
+
+    def __init__(self, scale=DETECTION_SCALE, model=DETECTION_MODEL,
+                 upsample=DETECTION_UPSAMPLE, roi_margin=DETECTION_ROI_MARGIN):
+        if model not in DETECTION_MODELS:
+            raise ValueError(f"Unknown detection model '{model}', expected one of {DETECTION_MODELS}")
+        if not 0 < scale <= 1:
+            raise ValueError("Detection scale must be in (0, 1]")
+        self.scale = scale
+        self.model = model
+        self.upsample = upsample
+        self.roi_margin = roi_margin
+        self.last_location = None
+
+    def detect(self, rgb_frame):
+        """Return face locations (top, right, bottom, left) in full-frame coordinates"""
+        roi = self._region_of_interest(rgb_frame.shape)
+        if roi is not None:
+            face_locations = self._detect_in(rgb_frame, roi)
+            if not face_locations:
+                # Lost the face around the last hit: fall back to the whole frame
+                face_locations = self._detect_in(rgb_frame, None)
+        else:
+            face_locations = self._detect_in(rgb_frame, None)
+
+        if face_locations:
+            self.last_location = max(face_locations, key=lambda loc: (loc[2] - loc[0]) * (loc[1] - loc[3]))
+        else:
+            self.last_location = None
+        return face_locations
+
+    def reset(self):
+        """Forget the last face so the next call searches the whole frame"""
+        self.last_location = None
+
+    def _region_of_interest(self, shape):
+        if self.roi_margin is None or self.last_location is None:
+            return None
+        height, width = shape[:2]
+        top, right, bottom, left = self.last_location
+        margin_y = int((bottom - top) * self.roi_margin)
+        margin_x = int((right - left) * self.roi_margin)
+        return (max(0, top - margin_y), min(width, right + margin_x),
+                min(height, bottom + margin_y), max(0, left - margin_x))
+
+    def _detect_in(self, rgb_frame, roi):
+        offset_y = offset_x = 0
+        image = rgb_frame
+        if roi is not None:
+            top, right, bottom, left = roi
+            image = rgb_frame[top:bottom, left:right]
+            offset_y, offset_x = top, left
+        if self.scale != 1:
+            image = cv2.resize(image, (0, 0), fx=self.scale, fy=self.scale)
+
+        face_locations = face_recognition.face_locations(
+            image, number_of_times_to_upsample=self.upsample, model=self.model)
+
+        height, width = rgb_frame.shape[:2]
+        return [(max(0, int(top / self.scale) + offset_y),
+                 min(width, int(right / self.scale) + offset_x),
+                 min(height, int(bottom / self.scale) + offset_y),
+                 max(0, int(left / self.scale) + offset_x))
+                for (top, right, bottom, left) in face_locations]
+
+class FaceTracker:
+    """Detect-every-N-frames face tracker
+
+    Drop-in replacement for FaceDetector: full detection runs every
+    detect_interval frames (or when the match score drops below
+    min_confidence) and the largest face is carried forward in between by
+    normalized template matching in a small window around its last box.
+    """
+
+    def __init__(self, detector=None, detect_interval=TRACKING_DETECT_INTERVAL,
+                 min_confidence=TRACKING_MIN_CONFIDENCE, search_margin=TRACKING_SEARCH_MARGIN):
+        self.detector = detector or FaceDetector()
+        self.detect_interval = detect_interval
+        self.min_confidence = min_confidence
+        self.search_margin = search_margin
+        self.full_detections = 0
+        self.tracked_frames = 0
+        self.last_confidence = None
+        self._template = None
+        self._template_scale = 1.0
+        self._location = None
+        self._frames_since_detection = 0
+
+    def detect(self, rgb_frame):
+        """Return face locations (top, right, bottom, left), tracking when possible"""
+        gray = cv2.cvtColor(rgb_frame, cv2.COLOR_RGB2GRAY)
+        if self._template is not None and self._frames_since_detection < self.detect_interval:
+            confidence = self._track(gray)
+            self.last_confidence = confidence
+            if confidence >= self.min_confidence:
+                self._frames_since_detection += 1
+                self.tracked_frames += 1
+                return [self._location]
+
+        face_locations = self.detector.detect(rgb_frame)
+        self.full_detections += 1
+        self._frames_since_detection = 1
+        if face_locations:
+            self._start_track(gray, self.detector.last_location)
+        else:
+            self._template = None
+            self._location = None
+        return face_locations
+
+    def reset(self):
+        """Drop the tracked face so the next frame runs full detection"""
+        self.detector.reset()
+        self._template = None
+        self._location = None
+
+    def _start_track(self, gray, location):
+        top, right, bottom, left = location
+        self._template_scale = min(1.0, TRACKING_TEMPLATE_SIZE / max(1, right - left))
+        self._template = cv2.resize(gray[top:bottom, left:right], (0, 0),
+                                    fx=self._template_scale, fy=self._template_scale)
+        self._location = location
+
+    def _track(self, gray):
+        top, right, bottom, left = self._location
+        box_height, box_width = bottom - top, right - left
+        margin_y = int(box_height * self.search_margin)
+        margin_x = int(box_width * self.search_margin)
+        height, width = gray.shape[:2]
+        window_top, window_left = max(0, top - margin_y), max(0, left - margin_x)
+        window = gray[window_top:min(height, bottom + margin_y), window_left:min(width, right + margin_x)]
+
+        scale = self._template_scale
+        window = cv2.resize(window, (0, 0), fx=scale, fy=scale)
+        template_height, template_width = self._template.shape[:2]
+        if window.shape[0] < template_height or window.shape[1] < template_width:
+            return 0.0
+
+        scores = cv2.matchTemplate(window, self._template, cv2.TM_CCOEFF_NORMED)
+        _, confidence, _, (x, y) = cv2.minMaxLoc(scores)
+        new_top = window_top + int(y / scale)
+        new_left = window_left + int(x / scale)
+        self._location = (new_top, new_left + box_width, new_top + box_height, new_left)
+        return float(confidence)
+
+def is_novel_template(templates, encoding, min_distance=TEMPLATE_MIN_DIVERSITY):
+    """True if an encoding adds information beyond the templates already kept"""
+    if templates is None or len(templates) == 0:
+        return True
+    distances = np.linalg.norm(np.atleast_2d(templates) - np.asarray(encoding, dtype=np.float32), axis=1)
+    return float(distances.min()) >= min_distance
+
+def largest_face(face_locations):
+    """The face location with the biggest box"""
+    return max(face_locations, key=lambda loc: (loc[2] - loc[0]) * (loc[1] - loc[3]))
+
+def capture_face(username, detector=None, templates_wanted=ENROLLMENT_TEMPLATES, cancel_event=None):
+    """Capture and save user's face image and its precomputed templates
+
+    After 's' saves the image, a few more templates are collected from the
+    following frames (ideally with slightly different angles or lighting).
+    Setting cancel_event (a threading.Event) stops the capture like 'q'.
+    """
     ensure_face_directory()
+    detector = detector or FaceDetector()
     
-    cam = cv2.VideoCapture(0)
-    if not cam.isOpened():
+    cameras = get_camera_manager()
+    cam = cameras.acquire()
+    if cam is None:
         print("❌ Failed to open camera.")
         return False
     
     print("✅ Camera opened. Position your face in the frame and press 's' to save...")
     face_captured = False
+    templates_wanted = max(1, min(templates_wanted, MAX_TEMPLATES))
+    templates = []
+    collecting_until = None
     
     while True:
         ret, frame = cam.read()
@@ -35,12 +353,29 @@ def capture_face(username):
         
         # Detect faces in the frame
         rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        face_locations = face_recognition.face_locations(rgb_frame)
+        face_locations = detector.detect(rgb_frame)
         
         # Draw rectangles around detected faces
         for (top, right, bottom, left) in face_locations:
             cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
         
+        if collecting_until is not None:
+            # Extra templates: keep any clearly different view of the face until we have enough
+            if len(face_locations) > 0:
+                encodings = face_recognition.face_encodings(rgb_frame, [largest_face(face_locations)])
+                if encodings and is_novel_template(templates, encodings[0]):
+                    templates.append(encodings[0])
+            if len(templates) >= templates_wanted or time.monotonic() >= collecting_until:
+                save_templates(username, templates)
+                print(f"✅ Stored {len(templates)} face template(s) for {username}")
+                face_captured = True
+                break
+            cv2.putText(frame, f"Move your head slightly... ({len(templates)}/{templates_wanted})", 
+                       (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+            cv2.imshow("Face Capture - Position your face clearly", frame)
+            cv2.waitKey(1)
+            continue
+        
         # Display instructions
         cv2.putText(frame, "Press 's' to save face, 'q' to quit", 
                    (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
@@ -57,57 +392,363 @@ def capture_face(username):
         key = cv2.waitKey(1) & 0xFF
         if key == ord('s'):
             if len(face_locations) > 0:
-                filepath = os.path.join(FACE_DIR, f"{username}.jpg")
+                filepath = face_image_path(username)
+                os.makedirs(os.path.dirname(filepath), exist_ok=True)
                 cv2.imwrite(filepath, frame)
                 print(f"✅ Face saved as {filepath}")
-                face_captured = True
-                break
+                # Encode once at enrollment so verification never has to re-encode the image
+                encodings = face_recognition.face_encodings(rgb_frame, [largest_face(face_locations)])
+                if not encodings:
+                    face_captured = True
+                    break
+                templates.append(encodings[0])
+                collecting_until = time.monotonic() + ENROLLMENT_EXTRA_SECONDS
             else:
                 print("❌ No face detected! Please position your face clearly and try again.")
-        elif key == ord('q'):
+        elif key == ord('q') or (cancel_event is not None and cancel_event.is_set()):
             print("❌ Face capture cancelled by user.")
             break
     
-    cam.release()
+    cameras.release()
     cv2.destroyAllWindows()
     return face_captured
 
-def verify_face(username):
-    """Verify user's face against stored image"""
-    filepath = os.path.join(FACE_DIR, f"{username}.jpg")
-    
+def load_known_encoding(username):
+    """Load a user's stored templates, migrating JPEG-only users on first use
+
+    Returns a (count, 128) float32 array, or None if there is no usable face data.
+    """
+    templates = load_templates(username)
+    if templates is not None:
+        return templates
+
+    filepath = face_image_path(username)
     if not os.path.exists(filepath):
         print(f"❌ No face data found for user: {username}")
-        return False
+        return None
     
     try:
-        # Load the known face
+        # Older enrollments only have the image: encode it once and persist the result
         known_image = face_recognition.load_image_file(filepath)
         known_encodings = face_recognition.face_encodings(known_image)
         
         if len(known_encodings) == 0:
             print("❌ No face found in registered image.")
-            return False
+            return None
         
         known_encoding = known_encodings[0]
         
     except Exception as e:
         print(f"❌ Error loading registered face: {e}")
+        return None
+
+    try:
+        save_embedding(username, known_encoding)
+        print(f"✅ Migrated face data for {username} to a stored encoding")
+    except Exception as e:
+        print(f"❌ Error saving face encoding: {e}")
+    return np.atleast_2d(known_encoding).astype(np.float32)
+
+class PipelineStats:
+    """Per-stage latency samples and frame counters for a face pipeline run"""
+
+    def __init__(self):
+        self.timings = {}
+        self.frames_processed = 0
+        self.dropped_frames = 0
+        self.frames_skipped = 0  # frames whose faces all failed the quality gate
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.timings.setdefault(stage, []).append(seconds)
+
+    def summary(self):
+        """Latency percentiles in milliseconds for every recorded stage"""
+        with self._lock:
+            timings = {stage: list(samples) for stage, samples in self.timings.items()}
+        summary = {}
+        for stage, samples in timings.items():
+            samples_ms = np.array(samples) * 1000.0
+            summary[stage] = {
+                'count': len(samples),
+                'mean_ms': float(samples_ms.mean()),
+                'p50_ms': float(np.percentile(samples_ms, 50)),
+                'p95_ms': float(np.percentile(samples_ms, 95)),
+                'p99_ms': float(np.percentile(samples_ms, 99)),
+                'max_ms': float(samples_ms.max()),
+            }
+        return summary
+
+    def report(self):
+        """Print a one-line summary per stage"""
+        for stage, s in self.summary().items():
+            print(f"⏱  {stage:<8} n={s['count']:<4} mean={s['mean_ms']:.1f}ms "
+                  f"p50={s['p50_ms']:.1f}ms p95={s['p95_ms']:.1f}ms max={s['max_ms']:.1f}ms")
+        print(f"⏱  frames processed={self.frames_processed} dropped={self.dropped_frames} "
+              f"skipped={self.frames_skipped}")
+
+class LatestFrame:
+    """Single-slot buffer that only ever holds the newest frame"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frame = None
+        self._seq = 0
+        self._taken_seq = 0
+        self._closed = False
+        self.dropped = 0  # frames overwritten before the consumer took them
+
+    def put(self, frame):
+        with self._cond:
+            if self._seq > self._taken_seq:
+                self.dropped += 1
+            self._frame = frame
+            self._seq += 1
+            self._cond.notify_all()
+
+    def take(self, timeout=None):
+        """Wait for a frame newer than the last one taken; None once closed"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._closed or self._seq > self._taken_seq, timeout)
+            if self._seq <= self._taken_seq:
+                return None
+            self._taken_seq = self._seq
+            return self._frame
+
+    def peek(self):
+        """Newest frame without consuming it (for display)"""
+        with self._cond:
+            return self._frame
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+class FaceQualityGate:
+    """Cheap pre-encode checks that reject frames not worth encoding
+
+    Looks at face size, sharpness (variance of the Laplacian), brightness
+    and, optionally, a yaw estimate from the 5-point landmarks.
+    """
+
+    def __init__(self, min_face_size=QUALITY_MIN_FACE_SIZE, min_sharpness=QUALITY_MIN_SHARPNESS,
+                 brightness_range=QUALITY_BRIGHTNESS_RANGE, max_yaw=QUALITY_MAX_YAW):
+        self.min_face_size = min_face_size
+        self.min_sharpness = min_sharpness
+        self.brightness_range = brightness_range
+        self.max_yaw = max_yaw  # None disables the pose check
+        self.rejections = {}
+
+    def check(self, rgb_frame, location):
+        """Return (passed, reason) for one face; reason is None when it passed"""
+        reason = self._check(rgb_frame, location)
+        if reason is not None:
+            self.rejections[reason] = self.rejections.get(reason, 0) + 1
+        return reason is None, reason
+
+    def _check(self, rgb_frame, location):
+        top, right, bottom, left = location
+        if bottom - top < self.min_face_size:
+            return "too small"
+
+        gray = cv2.cvtColor(rgb_frame[top:bottom, left:right], cv2.COLOR_RGB2GRAY)
+        if gray.size == 0:
+            return "too small"
+        brightness = float(gray.mean())
+        if not self.brightness_range[0] <= brightness <= self.brightness_range[1]:
+            return "too dark" if brightness < self.brightness_range[0] else "too bright"
+        if cv2.Laplacian(gray, cv2.CV_64F).var() < self.min_sharpness:
+            return "blurry"
+
+        if self.max_yaw is not None:
+            landmarks = face_recognition.face_landmarks(rgb_frame, [location], model="small")
+            if landmarks:
+                points = landmarks[0]
+                left_eye = np.mean(points['left_eye'], axis=0)
+                right_eye = np.mean(points['right_eye'], axis=0)
+                nose = np.mean(points['nose_tip'], axis=0)
+                eye_distance = abs(right_eye[0] - left_eye[0])
+                if eye_distance == 0:
+                    return "turned away"
+                yaw = abs(nose[0] - (left_eye[0] + right_eye[0]) / 2) / eye_distance
+                if yaw > self.max_yaw:
+                    return "turned away"
+        return None
+
+class SequentialVerifier:
+    """Sequential probability ratio test over per-frame face distances
+
+    Each frame adds log-likelihood evidence for "genuine" versus "impostor"
+    (two Gaussians over the distance). The run accepts once the evidence
+    reaches the bound implied by false_accept_rate/false_reject_rate and
+    rejects at the opposite bound, usually after only a few frames.
+    """
+
+    def __init__(self, false_accept_rate=VOTING_FALSE_ACCEPT_RATE,
+                 false_reject_rate=VOTING_FALSE_REJECT_RATE,
+                 genuine_mean=VOTING_GENUINE_MEAN, impostor_mean=VOTING_IMPOSTOR_MEAN,
+                 sigma=VOTING_SIGMA, max_frame_evidence=VOTING_MAX_FRAME_EVIDENCE):
+        self.accept_bound = np.log((1 - false_reject_rate) / false_accept_rate)
+        self.reject_bound = np.log(false_reject_rate / (1 - false_accept_rate))
+        self.genuine_mean = genuine_mean
+        self.impostor_mean = impostor_mean
+        self.sigma = sigma
+        self.max_frame_evidence = max_frame_evidence
+        self.reset()
+
+    def reset(self):
+        self.evidence = 0.0
+        self.frames = 0
+        self.decision = None
+
+    def add(self, distance):
+        """Add one frame's distance; returns True (accept), False (reject) or None"""
+        if self.decision is not None:
+            return self.decision
+        log_ratio = ((distance - self.impostor_mean) ** 2 - (distance - self.genuine_mean) ** 2) / (2 * self.sigma ** 2)
+        self.evidence += float(np.clip(log_ratio, -self.max_frame_evidence, self.max_frame_evidence))
+        self.frames += 1
+        if self.evidence >= self.accept_bound:
+            self.decision = True
+        elif self.evidence <= self.reject_bound:
+            self.decision = False
+        return self.decision
+
+def detect_and_match(rgb_frame, known_encoding, threshold=VERIFICATION_THRESHOLD, stats=None,
+                     detector=None, quality_gate=None):
+    """Detect, encode and compare the faces in one RGB frame
+
+    known_encoding may be one encoding or a (count, 128) block of templates;
+    every face is compared with every template in one vectorized call.
+    Returns (face_locations, matched, best_distance, best_encoding); the
+    last two are None when no face was found or none passed the quality gate.
+    """
+    detector = detector or FaceDetector()
+    started = time.perf_counter()
+    face_locations = detector.detect(rgb_frame)
+    detected = time.perf_counter()
+
+    encode_locations = face_locations
+    if quality_gate is not None and face_locations:
+        encode_locations = [location for location in face_locations
+                            if quality_gate.check(rgb_frame, location)[0]]
+        if stats is not None:
+            stats.record('quality', time.perf_counter() - detected)
+            if not encode_locations:
+                stats.frames_skipped += 1
+        detected = time.perf_counter()
+
+    face_encodings = []
+    if encode_locations:
+        face_encodings = face_recognition.face_encodings(rgb_frame, encode_locations)
+    encoded = time.perf_counter()
+
+    best_distance = None
+    best_encoding = None
+    if face_encodings:
+        templates = np.atleast_2d(known_encoding)
+        # (faces, templates) distance matrix
+        distances = np.linalg.norm(np.asarray(face_encodings)[:, None, :] - templates[None, :, :], axis=2)
+        best_face = int(distances.min(axis=1).argmin())
+        best_distance = float(distances[best_face].min())
+        best_encoding = face_encodings[best_face]
+    compared = time.perf_counter()
+
+    if stats is not None:
+        stats.record('detect', detected - started)
+        if face_encodings:
+            stats.record('encode', encoded - detected)
+            stats.record('compare', compared - encoded)
+    matched = best_distance is not None and best_distance <= threshold
+    return face_locations, matched, best_distance, best_encoding
+
+def frame_verdict(matched, distance, decision_rule=None):
+    """True to accept, False to reject, None to keep looking at more frames"""
+    if decision_rule is None:
+        # Legacy rule: accept on the first matching frame, never reject early
+        return True if matched else None
+    if distance is None:
+        return None
+    return decision_rule.add(distance)
+
+def draw_verification_overlay(frame, face_locations, verification_attempts, max_attempts, face_found):
+    """Draw face boxes and status text for the verification window"""
+    # Draw rectangles around faces
+    for (top, right, bottom, left) in face_locations:
+        cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
+    
+    # Display status
+    cv2.putText(frame, f"Verifying... {verification_attempts}/{max_attempts}", 
+               (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+    
+    if face_found:
+        cv2.putText(frame, "Face detected - Checking...", 
+                   (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+    else:
+        cv2.putText(frame, "No face detected", 
+                   (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+    
+    # Add instruction text
+    cv2.putText(frame, "Press 'q' to cancel", 
+               (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
+
+def verify_face(username, pipelined=False, stats=None, detector=None,
+                quality_gate=None, decision_rule=None, update_templates=False, cancel_event=None):
+    """Verify user's face against stored encoding
+
+    With pipelined=True, capture, detection and display run on separate
+    threads so slow detection no longer caps the frame rate. Pass a
+    PipelineStats to collect per-stage latency and dropped-frame counts,
+    and a FaceDetector to change the detection model, scale or ROI (or a
+    FaceTracker to only run full detection every few frames).
+
+    A FaceQualityGate skips frames not worth encoding, and a
+    SequentialVerifier replaces "accept on the first matching frame" with
+    an early accept/reject decision over several frames. With
+    update_templates=True, a confident match that differs enough from the
+    stored templates is kept as an extra template. Setting cancel_event (a
+    threading.Event, e.g. from another thread) cancels like pressing 'q'.
+    """
+    detector = detector or FaceDetector()
+    if decision_rule is not None:
+        decision_rule.reset()
+    known_encoding = load_known_encoding(username)
+    if known_encoding is None:
         return False
     
-    # Start camera for verification
-    cam = cv2.VideoCapture(0)
-    if not cam.isOpened():
+    # Camera is shared and kept warm, so no fixed start-up delay is needed here
+    cameras = get_camera_manager()
+    cam = cameras.acquire()
+    if cam is None:
         print("❌ Failed to open camera for verification.")
         return False
     
     print("🔍 Face verification in progress. Look at the camera...")
+
+    if pipelined:
+        verified, distance, encoding = _verify_face_pipelined(
+            cam, known_encoding, stats or PipelineStats(), detector, quality_gate, decision_rule,
+            cancel_event)
+    else:
+        verified, distance, encoding = _verify_face_serial(
+            cam, known_encoding, stats, detector, quality_gate, decision_rule, cancel_event)
+
+    cameras.release()
+    cv2.destroyAllWindows()
+    if not verified:
+        print("❌ Face verification failed. No matching face found.")
+    elif (update_templates and distance <= TEMPLATE_UPDATE_DISTANCE
+          and is_novel_template(known_encoding, encoding)):
+        add_template(username, encoding)
+        print(f"✅ Added a face template for {username}")
+    return verified
+
+def _verify_face_serial(cam, known_encoding, stats, detector, quality_gate, decision_rule,
+                        cancel_event=None):
     verification_attempts = 0
-    max_attempts = 100  # Increased attempts for better verification
-    verification_threshold = 0.6  # Face recognition confidence threshold
-    
-    # Add a small delay to ensure camera is ready
-    cv2.waitKey(1000)
+    max_attempts = MAX_VERIFICATION_ATTEMPTS
     
     while verification_attempts < max_attempts:
         ret, frame = cam.read()
@@ -122,83 +763,311 @@ def verify_face(username):
         # Convert BGR to RGB
         rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         
-        # Find faces and encodings in current frame
-        face_locations = face_recognition.face_locations(rgb_frame)
-        face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
-        
-        # Draw rectangles around faces
-        for (top, right, bottom, left) in face_locations:
-            cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
-        
-        # Display status
-        cv2.putText(frame, f"Verifying... {verification_attempts}/{max_attempts}", 
-                   (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
-        
-        if len(face_encodings) > 0:
-            cv2.putText(frame, "Face detected - Checking...", 
-                       (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-        else:
-            cv2.putText(frame, "No face detected", 
-                       (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-        
-        # Add instruction text
-        cv2.putText(frame, "Press 'q' to cancel", 
-                   (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
+        # Find faces in current frame and compare them with the known face
+        face_locations, matched, distance, encoding = detect_and_match(
+            rgb_frame, known_encoding, stats=stats, detector=detector, quality_gate=quality_gate)
+        if stats is not None:
+            stats.frames_processed += 1
         
+        draw_verification_overlay(frame, face_locations, verification_attempts, max_attempts,
+                                  distance is not None)
         cv2.imshow("Face Verification - Look at the camera", frame)
         
-        # Check each detected face
-        for face_encoding in face_encodings:
-            # Compare with known face
-            matches = face_recognition.compare_faces([known_encoding], face_encoding, tolerance=verification_threshold)
-            face_distances = face_recognition.face_distance([known_encoding], face_encoding)
-            
-            if matches[0]:
-                confidence = 1 - face_distances[0]
-                print(f"✅ Face verified! Confidence: {confidence:.2f}")
-                cam.release()
-                cv2.destroyAllWindows()
-                return True
+        verdict = frame_verdict(matched, distance, decision_rule)
+        if verdict:
+            confidence = 1 - distance
+            print(f"✅ Face verified! Confidence: {confidence:.2f}")
+            return True, distance, encoding
+        if verdict is False:
+            print("❌ Face does not match the registered user.")
+            return False, distance, encoding
         
         verification_attempts += 1
         
         # Allow manual exit
         key = cv2.waitKey(30) & 0xFF  # Reduced wait time for more responsive UI
-        if key == ord('q'):
+        if key == ord('q') or (cancel_event is not None and cancel_event.is_set()):
             print("❌ Face verification cancelled by user.")
             break
     
-    cam.release()
-    cv2.destroyAllWindows()
-    print("❌ Face verification failed. No matching face found.")
-    return False
+    return False, None, None
+
+def _verify_face_pipelined(cam, known_encoding, stats, detector, quality_gate, decision_rule,
+                           cancel_event=None):
+    # Don't let the driver queue up stale frames behind the ones we drop
+    cam.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    max_attempts = MAX_VERIFICATION_ATTEMPTS
+    frames = LatestFrame()
+    stop = threading.Event()
+    result_lock = threading.Lock()
+    result = {'face_locations': [], 'verdict': None, 'distance': None, 'encoding': None}
+
+    def capture_loop():
+        failed_reads = 0
+        while not stop.is_set():
+            started = time.perf_counter()
+            ret, frame = cam.read()
+            if not ret:
+                failed_reads += 1
+                if failed_reads >= max_attempts:
+                    print("❌ Failed to read frame from camera.")
+                    stop.set()
+                continue
+            failed_reads = 0
+            frame = cv2.flip(frame, 1)
+            stats.record('capture', time.perf_counter() - started)
+            frames.put(frame)
+        frames.close()
+
+    def detect_loop():
+        while not stop.is_set() and stats.frames_processed < max_attempts:
+            frame = frames.take(timeout=0.5)
+            if frame is None:
+                continue
+            started = time.perf_counter()
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            stats.record('convert', time.perf_counter() - started)
+            face_locations, matched, distance, encoding = detect_and_match(
+                rgb_frame, known_encoding, stats=stats, detector=detector, quality_gate=quality_gate)
+            verdict = frame_verdict(matched, distance, decision_rule)
+            with result_lock:
+                result.update(face_locations=face_locations, verdict=verdict, distance=distance,
+                              encoding=encoding)
+                stats.frames_processed += 1
+            if verdict is not None:
+                break
+        stop.set()
+
+    workers = [threading.Thread(target=capture_loop, name="face-capture", daemon=True),
+               threading.Thread(target=detect_loop, name="face-detect", daemon=True)]
+    for worker in workers:
+        worker.start()
+
+    cancelled = False
+    while not stop.is_set():
+        frame = frames.peek()
+        if frame is not None:
+            started = time.perf_counter()
+            frame = frame.copy()
+            with result_lock:
+                face_locations = result['face_locations']
+                face_found = result['distance'] is not None
+                processed = stats.frames_processed
+            draw_verification_overlay(frame, face_locations, processed, max_attempts, face_found)
+            cv2.imshow("Face Verification - Look at the camera", frame)
+            stats.record('display', time.perf_counter() - started)
+        
+        # Allow manual exit
+        key = cv2.waitKey(1) & 0xFF
+        if key == ord('q') or (cancel_event is not None and cancel_event.is_set()):
+            print("❌ Face verification cancelled by user.")
+            cancelled = True
+            stop.set()
+
+    for worker in workers:
+        worker.join(timeout=2.0)
+    stats.dropped_frames = frames.dropped
+    stats.report()
+
+    if not cancelled and result['verdict']:
+        confidence = 1 - result['distance']
+        print(f"✅ Face verified! Confidence: {confidence:.2f}")
+        return True, result['distance'], result['encoding']
+    if result['verdict'] is False:
+        print("❌ Face does not match the registered user.")
+    return False, None, None
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+def iter_frames(source):
+    """Yield BGR frames from a video file, an image directory or an iterable of frames"""
+    if isinstance(source, (str, os.PathLike)):
+        if os.path.isdir(source):
+            for name in sorted(os.listdir(source)):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    frame = cv2.imread(os.path.join(source, name), cv2.IMREAD_COLOR)
+                    if frame is not None:
+                        yield frame
+            return
+
+        video = cv2.VideoCapture(os.fspath(source))
+        if not video.isOpened():
+            raise ValueError(f"Cannot open video source: {source}")
+        try:
+            while True:
+                ret, frame = video.read()
+                if not ret:
+                    break
+                yield frame
+        finally:
+            video.release()
+        return
+
+    yield from source
+
+def verify_face_headless(username, source, detector=None, quality_gate=None, decision_rule=None,
+                         max_frames=MAX_VERIFICATION_ATTEMPTS, threshold=VERIFICATION_THRESHOLD,
+                         stats=None):
+    """Verify a user against recorded frames with no camera or windows
+
+    source is anything iter_frames() accepts. Returns a dict with the
+    decision ('accept', 'reject' or 'undecided'), per-frame best distances
+    (None for frames without a usable face), frame counts and timings.
+    """
+    started = time.perf_counter()
+    known_encoding = load_known_encoding(username)
+    if known_encoding is None:
+        return {'username': username, 'verified': False, 'decision': 'no face data', 'distances': [],
+                'frames_processed': 0, 'time_to_decision': None,
+                'elapsed': time.perf_counter() - started, 'timings': {}}
+
+    result = verify_frames(known_encoding, iter_frames(source), detector, quality_gate, decision_rule,
+                           max_frames, threshold, stats, started)
+    result['username'] = username
+    return result
+
+def verify_frames(known_encoding, frames, detector=None, quality_gate=None, decision_rule=None,
+                  max_frames=MAX_VERIFICATION_ATTEMPTS, threshold=VERIFICATION_THRESHOLD,
+                  stats=None, started=None):
+    """Run the verification loop over BGR frames against a known encoding"""
+    stats = stats or PipelineStats()
+    started = started if started is not None else time.perf_counter()
+    result = {
+        'verified': False,
+        'decision': 'undecided',
+        'distances': [],
+        'frames_processed': 0,
+        'time_to_decision': None,
+        'elapsed': 0.0,
+        'timings': {},
+    }
+
+    detector = detector or FaceDetector()
+    if decision_rule is not None:
+        decision_rule.reset()
+
+    for frame in frames:
+        if stats.frames_processed >= max_frames:
+            break
+        frame_started = time.perf_counter()
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        stats.record('convert', time.perf_counter() - frame_started)
+
+        _, matched, distance, _ = detect_and_match(rgb_frame, known_encoding, threshold, stats=stats,
+                                                   detector=detector, quality_gate=quality_gate)
+        stats.frames_processed += 1
+        result['distances'].append(distance)
+
+        verdict = frame_verdict(matched, distance, decision_rule)
+        if verdict is not None:
+            result['verified'] = verdict
+            result['decision'] = 'accept' if verdict else 'reject'
+            result['time_to_decision'] = time.perf_counter() - started
+            break
+
+    result['frames_processed'] = stats.frames_processed
+    result['elapsed'] = time.perf_counter() - started
+    result['timings'] = stats.summary()
+    return result
+
+def enroll_face_headless(username, source, detector=None, quality_gate=None,
+                         max_frames=MAX_VERIFICATION_ATTEMPTS, templates_wanted=ENROLLMENT_TEMPLATES):
+    """Enroll a user from recorded frames with no camera or windows
+
+    Saves the first frame with a face (passing the quality gate, if given)
+    like capture_face, then keeps up to templates_wanted sufficiently
+    different encodings from the following frames. Returns a dict with the
+    outcome, templates stored, frames processed and elapsed time.
+    """
+    ensure_face_directory()
+    detector = detector or FaceDetector()
+    templates_wanted = max(1, min(templates_wanted, MAX_TEMPLATES))
+    result = {'username': username, 'enrolled': False, 'image_path': None, 'templates': 0,
+              'frames_processed': 0, 'elapsed': 0.0}
+    started = time.perf_counter()
+    templates = []
+
+    for frame in iter_frames(source):
+        if result['frames_processed'] >= max_frames:
+            break
+        result['frames_processed'] += 1
+
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        face_locations = detector.detect(rgb_frame)
+        if quality_gate is not None:
+            face_locations = [location for location in face_locations
+                              if quality_gate.check(rgb_frame, location)[0]]
+        if not face_locations:
+            continue
+
+        encodings = face_recognition.face_encodings(rgb_frame, [largest_face(face_locations)])
+        if not encodings or not is_novel_template(templates, encodings[0]):
+            continue
+
+        if not templates:
+            filepath = face_image_path(username)
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+            cv2.imwrite(filepath, frame)
+            result['image_path'] = filepath
+        templates.append(encodings[0])
+        if len(templates) >= templates_wanted:
+            break
+
+    if templates:
+        save_templates(username, templates)
+        result.update(enrolled=True, templates=len(templates))
+    result['elapsed'] = time.perf_counter() - started
+    return result
+
+def warm_up():
+    """Load and exercise the detector and encoder models once
+
+    Importing face_recognition loads the dlib models, and their first use
+    pays extra one-off initialization; doing both ahead of time (e.g. on a
+    background thread while the user types) keeps that off the first login.
+    """
+    started = time.perf_counter()
+    blank = np.zeros((120, 120, 3), dtype=np.uint8)
+    FaceDetector().detect(blank)
+    face_recognition.face_encodings(blank, [(20, 100, 100, 20)])
+    elapsed = time.perf_counter() - started
+    print(f"✅ Face models warmed up in {elapsed:.2f}s")
+    return elapsed
+
+def identify_face(face_encoding, top_k=5, tolerance=None):
+    """Match a live face encoding against every enrolled user (1:N)
+
+    Returns up to top_k (username, distance) pairs, closest first. If a
+    tolerance is given, candidates farther away than it are left out.
+    """
+    # The index skips every user that cannot be within tolerance
+    return identify(face_encoding, top_k, tolerance)
 
 def delete_face_data(username):
     """Delete face data for a user (for admin purposes)"""
-    filepath = os.path.join(FACE_DIR, f"{username}.jpg")
+    had_templates = delete_embedding(username)
+    filepath = face_image_path(username)
     if os.path.exists(filepath):
         try:
             os.remove(filepath)
-            print(f"✅ Face data deleted for user: {username}")
-            return True
         except Exception as e:
             print(f"❌ Error deleting face data: {e}")
             return False
-    else:
+    elif not had_templates:
         print(f"❌ No face data found for user: {username}")
         return False
+    print(f"✅ Face data deleted for user: {username}")
+    return True
 
 def list_face_data():
-    """List all users with face data"""
-    ensure_face_directory()
-    face_files = [f for f in os.listdir(FACE_DIR) if f.endswith('.jpg')]
-    usernames = [f.replace('.jpg', '') for f in face_files]
-    return usernames
+    """List all users with face data (from the face store index, no directory scan)"""
+    return list_embedded_usernames()
 
 def test_camera():
     """Test camera functionality"""
-    cam = cv2.VideoCapture(0)
-    if not cam.isOpened():
+    cameras = get_camera_manager()
+    cam = cameras.acquire()
+    if cam is None:
         print("❌ Camera not accessible")
         return False
     
@@ -217,7 +1086,7 @@ def test_camera():
         if cv2.waitKey(1) != -1:
             break
     
-    cam.release()
+    cameras.release()
     cv2.destroyAllWindows()
     print("✅ Camera test completed")
     return True
@@ -225,8 +1094,8 @@ def test_camera():
 # Debug function to check if face data exists
 def check_face_data_exists(username):
     """Check if face data exists for a user"""
-    filepath = os.path.join(FACE_DIR, f"{username}.jpg")
-    exists = os.path.exists(filepath)
+    filepath = face_image_path(username)
+    exists = has_embedding(username) or os.path.exists(filepath)
     print(f"Face data for {username}: {'EXISTS' if exists else 'NOT FOUND'} at {filepath}")
     return exists
 
@@ -0,0 +1,702 @@
+import atexit
+import mmap
+import os
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows locks with msvcrt instead
+    fcntl = None
+    import msvcrt
+
+FACE_DIR = "face_data"
+STORE_DIR = os.path.join(FACE_DIR, "store")  # Packed template shards and their indexes
+IMAGE_DIR = os.path.join(FACE_DIR, "images")  # Enrollment images, one subdirectory per shard
+
+SHARD_COUNT = 16  # Pack files users are spread over (by a stable hash of the username)
+MAX_TEMPLATES = 5  # Templates kept per user (the first, enrollment one is never rotated out)
+IDENTIFY_SHORTLIST_FACTOR = 4  # Users compared template by template first, per requested match
+COMPACT_GARBAGE_RATIO = 0.5  # Compact a shard once this share of its pack is dead records
+COMPACT_MIN_BYTES = 1 << 20  # ... and the dead records add up to at least this much
+
+# Pack file (<shard>.pack): append-only records, the latest one for a username wins
+#   magic (4s) | name length (H) | dimensions (H) | templates (H) | CRC32 (I)
+#   | username padded to 4 bytes | float32 block (templates x dimensions)
+# A record with 0 templates is a delete. The pack alone is enough to rebuild everything.
+#
+# Index file (<shard>.idx): header, then one entry per pack record
+#   magic (4s) | version (H) | dimensions (H)
+#   entry: pack offset (Q) | templates (H) | name length (H) | username
+# It lets the store open without scanning the packs; records appended after the
+# last indexed one (e.g. after a crash) are replayed from the pack on open.
+EMBEDDING_DIMENSIONS = 128
+RECORD_MAGIC = b"FREC"
+INDEX_MAGIC = b"FIDX"
+INDEX_VERSION = 1
+PACK_EXTENSION = ".pack"
+INDEX_EXTENSION = ".idx"
+LOCK_EXTENSION = ".lock"  # Empty file whose advisory lock serializes a shard's writers across processes
+_RECORD = struct.Struct("<4sHHHI")
+_INDEX_HEADER = struct.Struct("<4sHH")
+_INDEX_ENTRY = struct.Struct("<QHH")
+_DTYPE = np.dtype("<f4")
+
+def shard_of(username, shards=SHARD_COUNT):
+    """Shard number of a username (stable across processes, unlike hash())"""
+    return zlib.crc32(username.encode("utf-8")) % shards
+
+def face_image_path(username):
+    """Path of a user's enrollment image (sharded; older flat paths are still found)"""
+    path = os.path.join(IMAGE_DIR, f"{shard_of(username):02x}", f"{username}.jpg")
+    legacy_path = os.path.join(FACE_DIR, f"{username}.jpg")
+    if not os.path.exists(path) and os.path.exists(legacy_path):
+        return legacy_path
+    return path
+
+def _padded(length):
+    return (length + 3) & ~3
+
+def _record_size(name_length, count):
+    return _RECORD.size + _padded(name_length) + count * EMBEDDING_DIMENSIONS * _DTYPE.itemsize
+
+def _lock_file(f):
+    """Block until this process holds the exclusive advisory lock on an open file"""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            pass  # LK_LOCK gives up after 10 seconds; keep waiting
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+class PackShard:
+    """One pack file of template records plus its username -> offset index
+
+    Writers in every process serialize on an advisory lock on <shard>.lock
+    and catch up with the pack and index while holding it, so an append
+    never lands on top of another process's record. The pack stays open,
+    which tells a reader when another process compacted (replaced) it.
+    """
+
+    def __init__(self, directory, shard):
+        self.pack_path = os.path.join(directory, f"{shard:02x}{PACK_EXTENSION}")
+        self.index_path = os.path.join(directory, f"{shard:02x}{INDEX_EXTENSION}")
+        self.lock_path = os.path.join(directory, f"{shard:02x}{LOCK_EXTENSION}")
+        self.entries = {}  # username -> (record offset, templates)
+        self.end = 0  # Pack bytes covered by the entries
+        self.live_bytes = 0  # Bytes of the records the entries point at
+        self.compact_after = 0  # Pack size before compaction is tried again (after it was refused)
+        self._pack = None  # Open handle of the pack the entries describe
+        self._file_size = 0
+        self._index_size = 0  # Index bytes applied to the entries
+        self._map = None
+        self._lock_file = None
+        self._lock_depth = 0
+        self._load()
+
+    @contextmanager
+    def _locked(self):
+        """Hold the shard's inter-process lock (reentrant; callers serialize threads)"""
+        if self._lock_depth == 0:
+            if self._lock_file is None:
+                self._lock_file = open(self.lock_path, "a+b")
+            _lock_file(self._lock_file)
+        self._lock_depth += 1
+        try:
+            yield
+        finally:
+            self._lock_depth -= 1
+            if self._lock_depth == 0:
+                _unlock_file(self._lock_file)
+
+    def _load(self):
+        """Read the index from the start, then any pack records it is missing"""
+        with self._locked():
+            self._close_pack()
+            self.entries, self.end, self.live_bytes = {}, 0, 0
+            self._index_size = 0
+            self._catch_up()
+
+    def _apply(self, username, offset, count, size):
+        previous = self.entries.pop(username, None)
+        if previous is not None:
+            self.live_bytes -= _record_size(len(username.encode("utf-8")), previous[1])
+        if count:
+            self.entries[username] = (offset, count)
+            self.live_bytes += size
+        self.end = max(self.end, offset + size)
+
+    def refresh(self, force=False):
+        """Pick up records appended, or a compaction done, by other processes since the last look"""
+        try:
+            stat = os.stat(self.pack_path)
+        except FileNotFoundError:
+            stat = None
+        if force or not self._unchanged(stat):
+            with self._locked():
+                self._catch_up()
+
+    def _unchanged(self, stat):
+        # Same pack file (not replaced by a compaction) and no bytes appended to it
+        if self._pack is None:
+            return stat is None
+        return (stat is not None and stat.st_size == self._file_size
+                and os.path.samestat(stat, os.fstat(self._pack.fileno())))
+
+    def _catch_up(self):
+        # Call with the lock held
+        try:
+            stat = os.stat(self.pack_path)
+        except FileNotFoundError:
+            stat = None
+        if self._pack is not None and (stat is None or not os.path.samestat(stat, os.fstat(self._pack.fileno()))):
+            # Compacted by another process, which also rewrote the index: start over
+            self._load()
+            return
+        self._read_index()
+        if stat is None:
+            return
+        if self._pack is None:
+            self._pack = open(self.pack_path, "rb")
+        file_size = os.fstat(self._pack.fileno()).st_size
+        self._file_size = file_size
+        if file_size < self.end:
+            # The index points past the pack (lost or truncated outside the store): rebuild from it
+            self.entries, self.end, self.live_bytes = {}, 0, 0
+            self._map = None
+            self._write_index(self.entries)
+        if file_size <= self.end:
+            return
+
+        # Records without index entries, e.g. from a writer that crashed before indexing them
+        self._pack.seek(self.end)
+        data = self._pack.read(file_size - self.end)
+        start = self.end
+        replayed = []
+        position = 0
+        while position + _RECORD.size <= len(data):
+            magic, name_length, dimensions, count, checksum = _RECORD.unpack_from(data, position)
+            size = _record_size(name_length, count)
+            body = data[position + _RECORD.size:position + size]
+            if (magic != RECORD_MAGIC or dimensions != EMBEDDING_DIMENSIONS
+                    or position + size > len(data) or zlib.crc32(body) != checksum):
+                break  # torn record from an interrupted write; the next append overwrites it
+            username = body[:name_length].decode("utf-8")
+            self._apply(username, start + position, count, size)
+            replayed.append((username, start + position, count))
+            position += size
+        if replayed:
+            self._append_index(replayed)
+
+    def _read_index(self):
+        # Call with the lock held; applies the entries added since the last call
+        try:
+            with open(self.index_path, "rb") as f:
+                f.seek(self._index_size)
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+
+        position = 0
+        if self._index_size == 0:
+            if len(data) < _INDEX_HEADER.size or _INDEX_HEADER.unpack_from(data) != (
+                    INDEX_MAGIC, INDEX_VERSION, EMBEDDING_DIMENSIONS):
+                # Missing or foreign index: rebuilt from the pack
+                self._write_index(self.entries)
+                return
+            position = _INDEX_HEADER.size
+        while position + _INDEX_ENTRY.size <= len(data):
+            offset, count, name_length = _INDEX_ENTRY.unpack_from(data, position)
+            name_end = position + _INDEX_ENTRY.size + name_length
+            if name_end > len(data):
+                break
+            username = data[position + _INDEX_ENTRY.size:name_end].decode("utf-8")
+            self._apply(username, offset, count, _record_size(name_length, count))
+            position = name_end
+        self._index_size += position
+        if position != len(data):
+            # Torn last entry from an interrupted append: cut it off in place (other readers are behind it)
+            with open(self.index_path, "r+b") as f:
+                f.truncate(self._index_size)
+
+    def _write_index(self, entries):
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, EMBEDDING_DIMENSIONS))
+            for username, (offset, count) in entries.items():
+                name = username.encode("utf-8")
+                f.write(_INDEX_ENTRY.pack(offset, count, len(name)) + name)
+            size = f.tell()
+        os.replace(tmp_path, self.index_path)
+        self._index_size = size
+
+    def _append_index(self, records):
+        with open(self.index_path, "ab") as f:
+            for username, offset, count in records:
+                name = username.encode("utf-8")
+                f.write(_INDEX_ENTRY.pack(offset, count, len(name)) + name)
+            self._index_size = f.tell()
+
+    def append(self, username, block):
+        """Append a record (block of templates, or None to delete) and index it"""
+        name = username.encode("utf-8")
+        count = 0 if block is None else block.shape[0]
+        body = name.ljust(_padded(len(name)), b"\0")
+        if block is not None:
+            body += block.tobytes()
+        record = _RECORD.pack(RECORD_MAGIC, len(name), EMBEDDING_DIMENSIONS, count, zlib.crc32(body)) + body
+
+        with self._locked():
+            # Another process may have appended or compacted since we last looked
+            self._catch_up()
+            offset = self.end
+            with open(self.pack_path, "r+b" if os.path.exists(self.pack_path) else "wb") as f:
+                # Anything past the indexed end is a torn record; overwrite it
+                f.truncate(offset)
+                f.seek(offset)
+                f.write(record)
+            if self._pack is None:
+                self._pack = open(self.pack_path, "rb")
+            self._file_size = offset + len(record)
+            self._apply(username, offset, count, len(record))
+            self._append_index([(username, offset, count)])
+
+    def read(self, username):
+        """A user's templates as a (count, 128) float32 array, or None"""
+        entry = self.entries.get(username)
+        if entry is None:
+            return None
+        offset, count = entry
+        size = _record_size(len(username.encode("utf-8")), count)
+        if self._map is None or len(self._map) < offset + size:
+            self._remap()
+        record = self._map[offset:offset + size]
+        checksum = _RECORD.unpack_from(record)[4]
+        if zlib.crc32(record[_RECORD.size:]) != checksum:
+            print(f"❌ Embedding checksum mismatch for {username} in {self.pack_path}")
+            return None
+        data_offset = _RECORD.size + _padded(len(username.encode("utf-8")))
+        return np.frombuffer(record, dtype=_DTYPE, offset=data_offset).reshape(count, EMBEDDING_DIMENSIONS)
+
+    def _remap(self):
+        # Reads copy records out of the map, so the old one can simply be dropped
+        self._map = mmap.mmap(self._pack.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def garbage_bytes(self):
+        return self.end - self.live_bytes
+
+    def compact(self):
+        """Rewrite the pack with only the live records; returns bytes reclaimed"""
+        with self._locked():
+            self._catch_up()
+            reclaimed = self.garbage_bytes()
+            tmp_path = f"{self.pack_path}.tmp"
+            entries = {}
+            with open(tmp_path, "wb") as f:
+                for username in list(self.entries):
+                    offset, count = self.entries[username]
+                    size = _record_size(len(username.encode("utf-8")), count)
+                    if self._map is None or len(self._map) < offset + size:
+                        self._remap()
+                    entries[username] = (f.tell(), count)
+                    f.write(self._map[offset:offset + size])
+            self._close_pack()
+            try:
+                os.replace(tmp_path, self.pack_path)
+            except PermissionError:
+                # Windows: another process still has the pack open; retry once the pack has grown
+                os.remove(tmp_path)
+                self._catch_up()
+                self.compact_after = self.end + COMPACT_MIN_BYTES
+                return 0
+            self._write_index(entries)
+            self._load()
+            return reclaimed
+
+    def _close_pack(self):
+        self._map = None
+        if self._pack is not None:
+            self._pack.close()
+            self._pack = None
+        self._file_size = 0
+
+    def close(self):
+        self._close_pack()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+class FaceStore:
+    """Sharded, packed store of every user's face templates
+
+    Lookups, existence checks and deletes are dictionary operations on the
+    in-memory index; template reads come from read-only memory maps of the
+    packs. Writes only ever append, and shards are compacted once enough of
+    their records are dead. Several processes may write at once (the GUI
+    and bulk_enroll.py); each sees the others' writes on its next lookup.
+    """
+
+    def __init__(self, directory=STORE_DIR, shards=SHARD_COUNT):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._shards = [PackShard(directory, shard) for shard in range(shards)]
+        self._lock = threading.RLock()
+
+    def _shard(self, username):
+        shard = self._shards[shard_of(username, len(self._shards))]
+        shard.refresh()
+        return shard
+
+    def __contains__(self, username):
+        with self._lock:
+            return username in self._shard(username).entries
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(shard.entries) for shard in self._shards)
+
+    def usernames(self):
+        with self._lock:
+            for shard in self._shards:
+                shard.refresh()
+            return [username for shard in self._shards for username in shard.entries]
+
+    def get(self, username):
+        with self._lock:
+            return self._shard(username).read(username)
+
+    def put(self, username, block):
+        with self._lock:
+            shard = self._shard(username)
+            shard.append(username, block)
+            self._maybe_compact(shard)
+
+    def delete(self, username):
+        with self._lock:
+            shard = self._shard(username)
+            if username not in shard.entries:
+                return False
+            shard.append(username, None)
+            self._maybe_compact(shard)
+            return True
+
+    def items(self):
+        """Yield (username, templates) for every stored user"""
+        for username in self.usernames():
+            templates = self.get(username)
+            if templates is not None:
+                yield username, templates
+
+    def _maybe_compact(self, shard):
+        garbage = shard.garbage_bytes()
+        if (garbage >= COMPACT_MIN_BYTES and garbage >= shard.end * COMPACT_GARBAGE_RATIO
+                and shard.end >= shard.compact_after):
+            shard.compact()
+
+    def compact(self):
+        """Compact every shard now; returns the bytes reclaimed"""
+        with self._lock:
+            return sum(shard.compact() for shard in self._shards if shard.garbage_bytes())
+
+    def close(self):
+        with self._lock:
+            for shard in self._shards:
+                shard.close()
+
+_face_store = None
+_face_store_lock = threading.Lock()
+
+def get_face_store():
+    """Return the process-wide face store, opening it on first use"""
+    global _face_store
+    if _face_store is None:
+        with _face_store_lock:
+            if _face_store is None:
+                store = FaceStore()
+                atexit.register(store.close)
+                _face_store = store
+    return _face_store
+
+def save_templates(username, templates):
+    """Persist all face templates for a user as one float32 block (replaces older ones)"""
+    block = np.ascontiguousarray(np.atleast_2d(np.asarray(templates, dtype=_DTYPE)))
+    if block.ndim != 2 or block.shape[1] != EMBEDDING_DIMENSIONS:
+        raise ValueError(f"Expected {EMBEDDING_DIMENSIONS}-d encodings, got shape {block.shape}")
+    if not 1 <= block.shape[0] <= MAX_TEMPLATES:
+        raise ValueError(f"Expected 1 to {MAX_TEMPLATES} templates, got {block.shape[0]}")
+    get_face_store().put(username, block)
+    _index_add(username, block)
+
+def save_embedding(username, encoding):
+    """Persist a single face encoding for a user, replacing any templates"""
+    return save_templates(username, [encoding])
+
+def add_template(username, encoding, max_templates=MAX_TEMPLATES):
+    """Append a template for a user, rotating out the oldest non-enrollment one when full"""
+    templates = load_templates(username)
+    if templates is None:
+        return save_embedding(username, encoding)
+    vector = np.asarray(encoding, dtype=_DTYPE).reshape(1, -1)
+    if templates.shape[0] >= max_templates:
+        templates = np.vstack([templates[:1], templates[2:]])
+    return save_templates(username, np.vstack([templates, vector]))
+
+def load_templates(username):
+    """Load a user's templates as a (count, 128) float32 array, or None if missing or unreadable"""
+    return get_face_store().get(username)
+
+def has_embedding(username):
+    """True if templates are stored for a user"""
+    return username in get_face_store()
+
+def delete_embedding(username):
+    """Remove a user's stored templates; returns True if there were any"""
+    forget_user(username)
+    return get_face_store().delete(username)
+
+def list_embedded_usernames():
+    """Usernames that have stored templates"""
+    return get_face_store().usernames()
+
+class FaceIndex:
+    """1:N identification over every enrolled user's templates
+
+    Each user is a row holding the centroid of their templates plus the
+    radius of the templates around it. A search scans the centroids in one
+    matrix-vector product, which bounds every user's distance from below
+    (centroid distance minus radius), compares a shortlist of the closest
+    users exactly against their templates, and then only the users whose
+    bound can still beat the top_k found. When that prunes too little it
+    scans all templates at once instead. Either way the results are exactly
+    those of comparing every template.
+    """
+
+    def __init__(self, capacity=1024):
+        self._matrix = np.empty((capacity, EMBEDDING_DIMENSIONS), dtype=np.float32)
+        # Squared row norms, so distances reduce to one matrix-vector product
+        self._sq_norms = np.empty(capacity, dtype=np.float32)
+        self._radii = np.empty(capacity, dtype=np.float32)
+        # Template positions of every user, padded to MAX_TEMPLATES by repeating the first
+        self._slots = np.empty((capacity, MAX_TEMPLATES), dtype=np.int64)
+        self._owners = []  # username of every row
+        self._rows = {}  # username -> row number
+        # All templates in one block, with the row of the user each belongs to
+        self._templates = np.empty((capacity * 2, EMBEDDING_DIMENSIONS), dtype=np.float32)
+        self._template_sq_norms = np.empty(capacity * 2, dtype=np.float32)
+        self._template_rows = np.empty(capacity * 2, dtype=np.int64)
+        self._template_count = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, username):
+        return username in self._rows
+
+    def add(self, username, templates):
+        """Insert or replace a user's templates (one encoding or a (count, 128) block)"""
+        block = np.array(np.atleast_2d(templates), dtype=np.float32)[:MAX_TEMPLATES]
+        centroid = block.mean(axis=0)
+        radius = float(np.sqrt(((block - centroid) ** 2).sum(axis=1)).max())
+        with self._lock:
+            row = self._rows.get(username)
+            if row is None:
+                row = len(self._owners)
+                if row == self._matrix.shape[0]:
+                    self._grow()
+                self._owners.append(username)
+                self._rows[username] = row
+            else:
+                self._drop_templates(row)
+            self._matrix[row] = centroid
+            self._sq_norms[row] = centroid @ centroid
+            # Slack for float32 rounding in the centroid scan, so the bound never exceeds the exact distance
+            self._radii[row] = radius + 1e-3
+
+            start = self._template_count
+            while start + len(block) > self._templates.shape[0]:
+                self._grow_templates()
+            positions = np.arange(start, start + len(block))
+            self._templates[positions] = block
+            self._template_sq_norms[positions] = (block * block).sum(axis=1)
+            self._template_rows[positions] = row
+            self._template_count += len(block)
+            self._slots[row] = positions[0]
+            self._slots[row, :len(block)] = positions
+
+    def remove(self, username):
+        """Drop a user's row, moving the last row into its slot"""
+        with self._lock:
+            row = self._rows.pop(username, None)
+            if row is None:
+                return False
+            self._drop_templates(row)
+            last = len(self._owners) - 1
+            if row != last:
+                moved = self._owners[last]
+                for array in (self._matrix, self._sq_norms, self._radii, self._slots):
+                    array[row] = array[last]
+                self._template_rows[self._slots[row]] = row
+                self._owners[row] = moved
+                self._rows[moved] = row
+            self._owners.pop()
+            return True
+
+    def _drop_templates(self, row):
+        # Free a row's templates, moving the last templates into the holes (highest first,
+        # so the last template is never one of this row's still to be freed)
+        for position in sorted(set(self._slots[row].tolist()), reverse=True):
+            last = self._template_count - 1
+            if position != last:
+                owner = self._template_rows[last]
+                self._templates[position] = self._templates[last]
+                self._template_sq_norms[position] = self._template_sq_norms[last]
+                self._template_rows[position] = owner
+                self._slots[owner][self._slots[owner] == last] = position
+            self._template_count -= 1
+
+    def search(self, encoding, top_k=5, max_distance=None):
+        """Return up to top_k (username, distance) pairs, closest first
+
+        With max_distance, users farther away are left out, which also lets
+        the search skip every user whose bound is beyond it.
+        """
+        query = np.asarray(encoding, dtype=np.float32).ravel()
+        with self._lock:
+            count = len(self._owners)
+            if count == 0 or top_k <= 0:
+                return []
+            # |c - q|^2 = |c|^2 - 2 c.q + |q|^2 over all centroids at once
+            bounds = self._matrix[:count] @ query
+            bounds *= -2.0
+            bounds += self._sq_norms[:count]
+            bounds += query @ query
+            np.maximum(bounds, 0.0, out=bounds)
+            np.sqrt(bounds, out=bounds)
+            # No template is closer than its centroid's distance minus the radius
+            bounds -= self._radii[:count]
+
+            # The closest users by bound usually hold the top_k: their exact distances
+            # limit which other users still have to be compared at all
+            k = min(count, top_k * IDENTIFY_SHORTLIST_FACTOR)
+            rows = np.argpartition(bounds, k - 1)[:k] if k < count else np.arange(count)
+            distances = self._distances(rows, query)
+            limit = np.inf if max_distance is None else max_distance
+            if len(rows) >= top_k:
+                limit = min(limit, float(np.partition(distances, top_k - 1)[top_k - 1]))
+
+            remaining = bounds <= limit
+            remaining[rows] = False
+            extra = np.flatnonzero(remaining)
+            if len(extra) * 4 > count:
+                # Too little pruned to pay for gathering templates user by user
+                return self._scan(query, top_k, max_distance)
+            if len(extra):
+                rows = np.concatenate([rows, extra])
+                distances = np.concatenate([distances, self._distances(extra, query)])
+
+            if max_distance is not None:
+                keep = distances <= max_distance
+                rows, distances = rows[keep], distances[keep]
+            best = np.argsort(distances, kind="stable")[:top_k]
+            return [(self._owners[rows[i]], float(distances[i])) for i in best]
+
+    def _distances(self, rows, query, chunk=4096):
+        # Exact distance from the query to the closest template of each row
+        query_sq_norm = query @ query
+        distances = np.empty(len(rows), dtype=np.float32)
+        for start in range(0, len(rows), chunk):
+            positions = self._slots[rows[start:start + chunk]]
+            squared = (self._templates[positions.ravel()] @ query).reshape(positions.shape)
+            squared *= -2.0
+            squared += self._template_sq_norms[positions]
+            squared += query_sq_norm
+            distances[start:start + chunk] = squared.min(axis=1)
+        np.maximum(distances, 0.0, out=distances)
+        return np.sqrt(distances, out=distances)
+
+    def _scan(self, query, top_k, max_distance):
+        # Compare every template; the closest top_k * MAX_TEMPLATES always cover top_k users
+        total = self._template_count
+        squared = self._templates[:total] @ query
+        squared *= -2.0
+        squared += self._template_sq_norms[:total]
+        squared += query @ query
+        shortlist = min(total, top_k * MAX_TEMPLATES)
+        positions = np.argpartition(squared, shortlist - 1)[:shortlist] if shortlist < total else np.arange(total)
+        positions = positions[np.argsort(squared[positions], kind="stable")]
+        results = []
+        seen = set()
+        for position in positions:
+            row = int(self._template_rows[position])
+            if row in seen:
+                continue
+            distance = float(np.sqrt(max(squared[position], 0.0)))
+            if max_distance is not None and distance > max_distance:
+                break
+            seen.add(row)
+            results.append((self._owners[row], distance))
+            if len(results) == top_k:
+                break
+        return results
+
+    def _grow(self):
+        capacity = self._matrix.shape[0] * 2
+        self._matrix, self._sq_norms, self._radii, self._slots = [
+            _grown(array, capacity, len(self._owners))
+            for array in (self._matrix, self._sq_norms, self._radii, self._slots)]
+
+    def _grow_templates(self):
+        capacity = self._templates.shape[0] * 2
+        self._templates, self._template_sq_norms, self._template_rows = [
+            _grown(array, capacity, self._template_count)
+            for array in (self._templates, self._template_sq_norms, self._template_rows)]
+
+def _grown(array, capacity, used):
+    bigger = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+    bigger[:used] = array[:used]
+    return bigger
+
+_face_index = None
+_face_index_lock = threading.Lock()
+
+def get_face_index():
+    """Return the process-wide identification index, loading it on first use"""
+    global _face_index
+    if _face_index is None:
+        with _face_index_lock:
+            if _face_index is None:
+                store = get_face_store()
+                index = FaceIndex(capacity=max(1024, len(store) * 2))
+                for username, templates in store.items():
+                    index.add(username, templates)
+                _face_index = index
+    return _face_index
+
+def _index_add(username, templates):
+    # Only keep an index current once something has asked for it
+    if _face_index is not None:
+        _face_index.add(username, templates)
+
+def forget_user(username):
+    """Remove a user from the identification index (no-op if it is not loaded)"""
+    if _face_index is not None:
+        _face_index.remove(username)
+
+def identify(encoding, top_k=5, max_distance=None):
+    """Match one encoding against every enrolled user"""
+    return get_face_index().search(encoding, top_k, max_distance)
@@ -0,0 +1,333 @@
+import atexit
+import ctypes
+import ctypes.util
+import hashlib
+import os
+import select
+import sqlite3
+import struct
+import sys
+import threading
+
+FILE_INDEX_PATH = "file_index.db"  # Metadata index of the secure folder (kept next to the program, not inside the folder)
+FILE_SUFFIX = ".txt"  # Only these files are secure files
+FILE_PAGE_SIZE = 200  # Files returned per page of a listing
+FILE_INDEX_POLL_INTERVAL = 30.0  # Seconds between reconciliation scans where inotify is not available
+RECONCILE_BATCH_SIZE = 5000  # Files scanned or re-indexed per transaction
+CHECKSUM_BLOCK_SIZE = 1024 * 1024
+
+# Sort key -> (indexed column, its position in a row); every listing is ordered by (column, name)
+SORT_COLUMNS = {'name': ('name', 0), 'size': ('size', 2), 'modified': ('mtime_ns', 3)}
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS files (
+        name TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        checksum TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_files_size ON files (size, name)",
+    "CREATE INDEX IF NOT EXISTS idx_files_mtime ON files (mtime_ns, name)",
+    "CREATE TABLE IF NOT EXISTS index_info (key TEXT PRIMARY KEY, value TEXT)",
+]
+
+# inotify(7)
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len (followed by the name)
+
+def owner_of(name):
+    """Owner part of a secure file name (the GUI names files <username>_<name>.txt)
+
+    Exact because registration rejects usernames containing '_'.
+    """
+    return name.split("_", 1)[0]
+
+def file_checksum(path):
+    """SHA-256 of the stored bytes, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(CHECKSUM_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class InotifyWatch:
+    """Names changed in one directory, from Linux inotify (via libc; no extra dependency)"""
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"Cannot watch {directory}")
+
+    def read(self, timeout):
+        """Wait up to timeout seconds; returns (changed names, overflowed, directory_gone)"""
+        names, overflowed, gone = set(), False, False
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return names, overflowed, gone
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            position = 0
+            while position < len(data):
+                _, mask, _, length = INOTIFY_EVENT.unpack_from(data, position)
+                position += INOTIFY_EVENT.size
+                name = os.fsdecode(data[position:position + length].rstrip(b"\0"))
+                position += length
+                if mask & IN_Q_OVERFLOW:
+                    overflowed = True
+                elif mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    gone = True
+                elif name:
+                    names.add(name)
+        return names, overflowed, gone
+
+    def close(self):
+        os.close(self.fd)
+
+class FileIndex:
+    """Persistent metadata index (name, owner, size, mtime, checksum) of the secure folder
+
+    start() reconciles the index with the folder (a stat-only scan;
+    checksums are recomputed only for new or changed files) and then keeps
+    it current from inotify events on Linux, or by reconciling every
+    FILE_INDEX_POLL_INTERVAL seconds elsewhere. page() is an indexed,
+    keyset-paginated query, so listings stay fast with millions of files.
+    """
+
+    def __init__(self, directory, path=FILE_INDEX_PATH, suffix=FILE_SUFFIX,
+                 poll_interval=FILE_INDEX_POLL_INTERVAL):
+        self.directory = os.path.abspath(directory)
+        self.path = path
+        self.suffix = suffix
+        self.poll_interval = poll_interval
+        self.live = False  # True while inotify keeps the index current
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+        connection = self._connection()
+        for statement in SCHEMA:
+            connection.execute(statement)
+        row = connection.execute("SELECT value FROM index_info WHERE key = 'directory'").fetchone()
+        if row is None or row[0] != self.directory:
+            # An index of another folder is useless: start over
+            connection.execute("DELETE FROM files")
+            connection.execute("INSERT OR REPLACE INTO index_info VALUES ('directory', ?)", (self.directory,))
+        connection.commit()
+
+    def _connection(self):
+        # One connection per thread; WAL lets listings read while the watcher writes
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30.0)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _metadata(self, name):
+        """(name, owner, size, mtime_ns, checksum) of a file in the folder, or None if it is gone"""
+        full_path = os.path.join(self.directory, name)
+        try:
+            stat = os.stat(full_path)
+            checksum = file_checksum(full_path)
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            return None
+        return name, owner_of(name), stat.st_size, stat.st_mtime_ns, checksum
+
+    def refresh_file(self, name):
+        """Bring one file's entry up to date (after the GUI writes it, or an inotify event)"""
+        if not name.endswith(self.suffix):
+            return
+        connection = self._connection()
+        full_path = os.path.join(self.directory, name)
+        try:
+            stat = os.stat(full_path)
+        except OSError:
+            stat = None
+        if stat is not None:
+            row = connection.execute("SELECT size, mtime_ns FROM files WHERE name = ?", (name,)).fetchone()
+            if row == (stat.st_size, stat.st_mtime_ns):
+                return
+        metadata = self._metadata(name) if stat is not None else None
+        with self._write_lock:
+            if metadata is None:
+                connection.execute("DELETE FROM files WHERE name = ?", (name,))
+            else:
+                connection.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)", metadata)
+            connection.commit()
+
+    def reconcile(self):
+        """Make the index match the folder; returns (added or changed, removed), or None if the folder is missing
+
+        The folder listing goes into a temporary table and the differences
+        are computed by SQLite, so memory use does not grow with the
+        number of files.
+        """
+        if not os.path.isdir(self.directory):
+            return None
+        connection = self._connection()
+        connection.execute("CREATE TEMP TABLE IF NOT EXISTS scan (name TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER)")
+        connection.execute("DELETE FROM scan")
+        batch = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith(self.suffix):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                batch.append((entry.name, stat.st_size, stat.st_mtime_ns))
+                if len(batch) >= RECONCILE_BATCH_SIZE:
+                    connection.executemany("INSERT OR REPLACE INTO scan VALUES (?, ?, ?)", batch)
+                    batch.clear()
+        connection.executemany("INSERT OR REPLACE INTO scan VALUES (?, ?, ?)", batch)
+        connection.commit()
+
+        with self._write_lock:
+            removed = connection.execute("DELETE FROM files WHERE name NOT IN (SELECT name FROM scan)").rowcount
+            connection.commit()
+
+        # New or changed files, a batch at a time (re-indexed rows drop out of the query)
+        changed, last = 0, ""
+        query = """
+        SELECT scan.name FROM scan LEFT JOIN files ON files.name = scan.name
+        WHERE scan.name > ? AND (files.name IS NULL OR files.size != scan.size OR files.mtime_ns != scan.mtime_ns)
+        ORDER BY scan.name LIMIT ?
+        """
+        while not self._stopping.is_set():
+            names = [row[0] for row in connection.execute(query, (last, RECONCILE_BATCH_SIZE))]
+            if not names:
+                break
+            rows = [metadata for metadata in map(self._metadata, names) if metadata is not None]
+            with self._write_lock:
+                connection.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)", rows)
+                connection.commit()
+            changed += len(rows)
+            last = names[-1]
+
+        connection.execute("DELETE FROM scan")
+        connection.commit()
+        return changed, removed
+
+    def page(self, sort="name", descending=False, owner=None, contains=None, after=None, limit=FILE_PAGE_SIZE):
+        """One page of (name, owner, size, mtime_ns, checksum) rows and the cursor of the next page
+
+        Sorted by name, size or modified (ties by name). owner keeps that
+        user's files; contains matches part of the name. Pass the returned
+        cursor as after for the following page; it is None on the last page.
+        """
+        column, position = SORT_COLUMNS[sort]
+        direction, compare = ("DESC", "<") if descending else ("ASC", ">")
+        conditions, params = [], []
+        if after is not None:
+            conditions.append(f"({column}, name) {compare} (?, ?)")
+            params += list(after)
+        if owner:
+            # Name range of <owner>_*, served by the primary key ('`' sorts right after '_')
+            conditions.append("name >= ? AND name < ?")
+            params += [owner + "_", owner + "`"]
+        if contains:
+            escaped = contains.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            conditions.append("name LIKE ? ESCAPE '\\'")
+            params.append(f"%{escaped}%")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"""
+        SELECT name, owner, size, mtime_ns, checksum FROM files {where}
+        ORDER BY {column} {direction}, name {direction} LIMIT ?
+        """
+        # One extra row tells us whether there is a next page
+        params.append(limit + 1)
+        rows = self._connection().execute(query, params).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = (rows[-1][position], rows[-1][0])
+        return rows, next_cursor
+
+    def start(self):
+        """Reconcile and then keep the index current on a daemon thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="file-index", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        watch = None
+        if sys.platform.startswith("linux"):
+            try:
+                # Watch before the startup scan, so nothing changed during the scan is missed
+                watch = InotifyWatch(self.directory)
+            except OSError as e:
+                print(f"⚠️ File index falls back to periodic scans: {e}")
+        self.live = watch is not None
+
+        try:
+            result = self.reconcile()
+            if result is not None:
+                print(f"✅ File index up to date ({result[0]} files indexed, {result[1]} removed)")
+            while not self._stopping.is_set():
+                if watch is None:
+                    self._stopping.wait(self.poll_interval)
+                    if not self._stopping.is_set():
+                        self.reconcile()
+                    continue
+                names, overflowed, gone = watch.read(timeout=1.0)
+                if overflowed:
+                    self.reconcile()
+                else:
+                    for name in names:
+                        self.refresh_file(name)
+                if gone:
+                    watch.close()
+                    watch = None
+                    self.live = False
+        except Exception as e:
+            print(f"❌ File index watcher stopped: {e}")
+        finally:
+            if watch is not None:
+                watch.close()
+            self.live = False
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_file_index(directory, path=FILE_INDEX_PATH):
+    """Return the (started) process-wide index of directory"""
+    key = (os.path.abspath(directory), path)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = FileIndex(directory, path)
+            index.start()
+            atexit.register(index.stop)
+            _indexes[key] = index
+    return index
@@ -1,21 +1,40 @@
-from face_module import capture_face, verify_face
 from database_setup import (
     register_user_to_db, 
     verify_user_credentials, 
-    update_last_login, 
+    complete_login,
     log_login_attempt,
-    create_database_connection,
-    delete_user_from_db  # <-- FIX 2: Import delete_user_from_db
+    pooled_connection,
+    user_exists,
+    list_users_page,
+    USER_PAGE_SIZE,
+    delete_user_from_db,  # <-- FIX 2: Import delete_user_from_db
+    start_login_retention,
+    get_login_throttle,
+    seed_login_throttle
 )
 import tkinter as tk
 from tkinter import messagebox, scrolledtext, ttk
 import os
 import subprocess
 import platform
+import threading
+import codecs
+from datetime import datetime
+from task_executor import TkTaskExecutor
+from password_hashing import get_password_hasher
+from secure_files import SecureFileError, open_secure_file, read_text, write_text
+from file_index import FILE_PAGE_SIZE, get_file_index
 
 # Define the same custom folder path as in C code
 CUSTOM_FOLDER = r"C:\Users\DELL\Desktop\secure folder"  # Change this to match your C code
 VALID_ROLES = {"admin", "user"}
+WARM_UP_FACE_MODELS = True  # Load the face models in the background while the login window is open
+FACE_QUALITY_GATE = True  # Skip blurry, dark, small or turned-away faces before encoding them at login
+FACE_SEQUENTIAL_DECISION = True  # Decide a login from the evidence of several frames (SPRT) instead of the first match
+RUN_LOGIN_RETENTION = True  # Roll up and prune old login attempts in the background while the GUI runs
+SEED_LOGIN_THROTTLE = True  # Load recent failed logins so the throttle survives a restart
+FILE_VIEW_BYTES = 1024 * 1024  # Text shown per page when viewing a file; more is decrypted on demand
+current_task = None  # Background login/registration step in progress, if any
 
 def create_directory_if_not_exists(path):
     """Create directory if it doesn't exist - same as C function"""
@@ -26,7 +45,72 @@ def create_directory_if_not_exists(path):
         except Exception as e:
             print(f"Error creating directory: {e}")
 
+def start_face_model_warm_up():
+    """Import face_module and warm up its models on a background thread"""
+    def warm_up():
+        try:
+            import face_module
+            face_module.warm_up()
+        except Exception as e:
+            print(f"❌ Face model warm-up failed: {e}")
+
+    thread = threading.Thread(target=warm_up, name="face-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+def set_busy(task, message):
+    """Disable the login form while a background step runs"""
+    global current_task
+    current_task = task
+    login_btn.config(state=tk.DISABLED)
+    register_btn.config(state=tk.DISABLED)
+    cancel_btn.config(state=tk.NORMAL)
+    cancel_btn.pack(pady=(0, 5))
+    status_label.config(text=message)
+
+def set_idle(message="Ready - Please login or register"):
+    global current_task
+    current_task = None
+    login_btn.config(state=tk.NORMAL)
+    register_btn.config(state=tk.NORMAL)
+    cancel_btn.pack_forget()
+    status_label.config(text=message)
+
+def cancel_current_task():
+    if current_task is not None:
+        current_task.cancel()
+        cancel_btn.config(state=tk.DISABLED)
+        status_label.config(text="Cancelling...")
+
+def run_form_task(fn, *args, status, on_success, error_title="Database Error"):
+    """Run one login/registration step off the Tk thread, keeping the form busy until it ends"""
+    def finished(result):
+        set_idle()
+        on_success(result)
+
+    def failed(error):
+        set_idle()
+        messagebox.showerror(error_title, str(error))
+
+    task = executor.submit(fn, *args, on_success=finished, on_error=failed,
+                           on_progress=lambda message: status_label.config(text=message),
+                           on_cancelled=lambda _: set_idle("Cancelled - Please login or register"))
+    set_busy(task, status)
+    return task
+
+def capture_and_register(task, username, password, role):
+    """Capture the face, then store the user; None if the capture failed"""
+    # Imported here so the heavy face libraries don't delay the login window
+    from face_module import capture_face
+    from face_store import face_image_path
+    if not capture_face(username, cancel_event=task.cancel_event):
+        return None
+    executor.progress(task, "💾 Saving user...")
+    return register_user_to_db(username, password, role, face_image_path(username))
+
 def register_user():
+    if current_task is not None:
+        return
     username = username_input.get().strip()
     password = password_input.get().strip()
     role = role_var.get().strip().lower()
@@ -35,8 +119,9 @@ def register_user():
         messagebox.showwarning("Input Error", "Please enter both username and password.")
         return
     
-    if ':' in username or len(username) < 3:
-        messagebox.showwarning("Input Error", "Username must be at least 3 characters and cannot contain ':'")
+    # '_' separates the owner in secure file names (<username>_<name>.txt)
+    if ':' in username or '_' in username or len(username) < 3:
+        messagebox.showwarning("Input Error", "Username must be at least 3 characters and cannot contain ':' or '_'")
         return
     
     if len(password) < 4:
@@ -47,53 +132,65 @@ def register_user():
         messagebox.showwarning("Input Error", "Invalid role selection.")
         return
 
-    # Check if user already exists in database
-    connection = create_database_connection()
-    if not connection:
-        messagebox.showerror("Database Error", "Could not connect to database.")
-        return
-    
-    try:
-        cursor = connection.cursor()
-        cursor.execute("SELECT username FROM users WHERE username = %s", (username,))
-        if cursor.fetchone():
+    def on_checked(existing_user):
+        if existing_user:
             messagebox.showwarning("Registration Error", "User already exists.")
             return
-    except Exception as e:
-        messagebox.showerror("Database Error", f"Error checking user: {e}")
-        return
-    finally:
-        if connection.is_connected():
-            cursor.close()
-            connection.close()
-
-    # Face capture step
-    messagebox.showinfo("Face Registration", 
-                       "We will now capture your face for biometric authentication.\n\n" +
-                       "Instructions:\n" +
-                       "1. Position your face clearly in the camera frame\n" +
-                       "2. Press 's' to save your face image\n" +
-                       "3. Press 'q' to cancel")
-    
-    if not capture_face(username):
-        messagebox.showerror("Face Capture Failed", "Face capture failed. Registration aborted.")
-        return
 
-    # Register user in database
-    face_image_path = os.path.join("face_data", f"{username}.jpg")
-    if register_user_to_db(username, password, role, face_image_path):
-        messagebox.showinfo("Registration Successful", 
-                           f"User '{username}' registered successfully!\n" +
-                           f"Role: {role}\n" +
-                           "You can now login with your credentials and face verification.")
-        # Clear input fields after successful registration
-        username_input.delete(0, tk.END)
-        password_input.delete(0, tk.END)
-        role_var.set("user")
+        # Face capture step
+        messagebox.showinfo("Face Registration", 
+                           "We will now capture your face for biometric authentication.\n\n" +
+                           "Instructions:\n" +
+                           "1. Position your face clearly in the camera frame\n" +
+                           "2. Press 's' to save your face image\n" +
+                           "3. Press 'q' to cancel")
+        run_form_task(capture_and_register, username, password, role,
+                      status="📷 Capturing face...", on_success=on_registered,
+                      error_title="Registration Failed")
+
+    def on_registered(registered):
+        if registered is None:
+            messagebox.showerror("Face Capture Failed", "Face capture failed. Registration aborted.")
+        elif registered:
+            messagebox.showinfo("Registration Successful", 
+                               f"User '{username}' registered successfully!\n" +
+                               f"Role: {role}\n" +
+                               "You can now login with your credentials and face verification.")
+            # Clear input fields after successful registration
+            username_input.delete(0, tk.END)
+            password_input.delete(0, tk.END)
+            role_var.set("user")
+        else:
+            messagebox.showerror("Registration Failed", "Failed to register user in database.")
+
+    # Check if user already exists in database
+    run_form_task(lambda task: user_exists(username), status="🔍 Checking username...", on_success=on_checked)
+
+def check_credentials(task, username, password):
+    user = verify_user_credentials(username, password)
+    if not user:
+        log_login_attempt(username, success=False)
+    return user
+
+def verify_and_record_login(task, username):
+    """Run face verification and record the outcome; returns whether it passed"""
+    from face_module import FaceQualityGate, SequentialVerifier, verify_face
+    quality_gate = FaceQualityGate() if FACE_QUALITY_GATE else None
+    decision_rule = SequentialVerifier() if FACE_SEQUENTIAL_DECISION else None
+    verified = verify_face(username, quality_gate=quality_gate, decision_rule=decision_rule,
+                           cancel_event=task.cancel_event)
+    if task.cancelled:
+        return False
+    if verified:
+        # Last-login update and attempt row in one transaction (one round trip)
+        complete_login(username, success=True)
     else:
-        messagebox.showerror("Registration Failed", "Failed to register user in database.")
+        log_login_attempt(username, success=False)
+    return verified
 
 def login_user():
+    if current_task is not None:
+        return
     username = username_input.get().strip()
     password = password_input.get().strip()
 
@@ -101,50 +198,59 @@ def login_user():
         messagebox.showwarning("Input Error", "Please enter both username and password.")
         return
 
-    # Verify credentials against database
-    user = verify_user_credentials(username, password)
-    if user:
-        face_image_path = user['face_image_path']
-        # Use face_image_path for verification
-    else:
-        log_login_attempt(username, success=False)
-        messagebox.showwarning("Login Error", "Invalid username or password.")
+    # Refused in memory, before any database round trip or camera work
+    retry_after = get_login_throttle().check(username)
+    if retry_after > 0:
+        minutes = max(1, round(retry_after / 60))
+        messagebox.showwarning("Too Many Attempts",
+                               "Too many failed login attempts.\n" +
+                               f"Please try again in about {minutes} minute(s).")
         return
 
-    # Face verification step
-    messagebox.showinfo("Face Verification", 
-                       "Please verify your identity with face recognition.\n\n" +
-                       "Instructions:\n" +
-                       "1. Look directly at the camera\n" +
-                       "2. Keep your face well-lit and clearly visible\n" +
-                       "3. Stay still during verification\n" +
-                       "4. Press 'q' to cancel if needed")
-    
-    if not verify_face(username):
-        log_login_attempt(username, success=False)
-        messagebox.showerror("Authentication Failed", 
-                           "Face verification failed. Access denied.\n\n" +
-                           "Please ensure:\n" +
-                           "• Your face is clearly visible\n" +
-                           "• Lighting is adequate\n" +
-                           "• You are the registered user")
-        return
+    def on_credentials(user):
+        if not user:
+            messagebox.showwarning("Login Error", "Invalid username or password.")
+            return
 
-    # Successful login
-    log_login_attempt(username, success=True)
-    update_last_login(username)
-    
-    messagebox.showinfo("Login Successful", 
-                       f"Welcome {username}!\n" +
-                       f"Role: {user['role']}\n" +
-                       "Face verification completed successfully.")
-    
-    # Clear input fields
-    username_input.delete(0, tk.END)
-    password_input.delete(0, tk.END)
-    
-    # Open secure file window
-    open_secure_file_window(username, user['role'])
+        # Face verification step
+        messagebox.showinfo("Face Verification", 
+                           "Please verify your identity with face recognition.\n\n" +
+                           "Instructions:\n" +
+                           "1. Look directly at the camera\n" +
+                           "2. Keep your face well-lit and clearly visible\n" +
+                           "3. Stay still during verification\n" +
+                           "4. Press 'q' to cancel if needed")
+        # Face data, files and login records are keyed on the name as registered, not as typed
+        run_form_task(verify_and_record_login, user['username'], status="🔍 Verifying face...",
+                      on_success=lambda verified: on_verified(user, verified),
+                      error_title="Authentication Failed")
+
+    def on_verified(user, verified):
+        if not verified:
+            messagebox.showerror("Authentication Failed", 
+                               "Face verification failed. Access denied.\n\n" +
+                               "Please ensure:\n" +
+                               "• Your face is clearly visible\n" +
+                               "• Lighting is adequate\n" +
+                               "• You are the registered user")
+            return
+
+        # Successful login
+        messagebox.showinfo("Login Successful", 
+                           f"Welcome {user['username']}!\n" +
+                           f"Role: {user['role']}\n" +
+                           "Face verification completed successfully.")
+        
+        # Clear input fields
+        username_input.delete(0, tk.END)
+        password_input.delete(0, tk.END)
+        
+        # Open secure file window
+        open_secure_file_window(user['username'], user['role'])
+
+    # Verify credentials against database
+    run_form_task(check_credentials, username, password, status="🔑 Checking credentials...",
+                  on_success=on_credentials)
 
 def toggle_theme():
     global dark_mode
@@ -206,24 +312,55 @@ def toggle_theme():
                         selectbackground="white")
         role_dropdown.configure(style="TCombobox")
         
-def list_files(directory=CUSTOM_FOLDER):
-    """List all text files in the custom folder directory"""
-    files = []
-    try:
-        if os.path.exists(directory):
-            for file in os.listdir(directory):
-                if file.endswith(".txt"):
-                    files.append(file)
-        else:
-            create_directory_if_not_exists(directory)
-    except Exception as e:
-        print(f"Error listing files: {e}")
-    return files
+def list_files(sort="name", descending=False, owner=None, contains=None, after=None):
+    """One page of secure files from the folder's index, and the cursor of the next page
+
+    Rows are (name, owner, size, mtime_ns, checksum); see FileIndex.page()
+    for the sort keys and filters. The index is kept up to date in the
+    background, so this never scans the folder.
+    """
+    return get_file_index(CUSTOM_FOLDER).page(sort, descending, owner, contains, after, FILE_PAGE_SIZE)
 
 def get_full_path(filename):
     """Get full path for file in custom folder"""
     return os.path.join(CUSTOM_FOLDER, filename)
 
+def show_file_pages(text_widget, full_path, button_frame):
+    """Show a secure file in a read-only text widget, FILE_VIEW_BYTES at a time
+
+    Only the chunks behind each page are read and decrypted, so opening a
+    very large file costs the same as a small one. Raises OSError or
+    SecureFileError if the first page cannot be read.
+    """
+    # Incremental decoding keeps characters split across pages intact
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    position = {'offset': 0}
+    more_btn = tk.Button(button_frame, text="Load More", font=("Segoe UI", 10), bg="#2196F3", fg="white")
+
+    def load_page():
+        with open_secure_file(full_path) as reader:
+            data = reader.read(position['offset'], FILE_VIEW_BYTES)
+            size = reader.size
+        position['offset'] += len(data)
+        done = position['offset'] >= size
+        text_widget.config(state=tk.NORMAL)
+        text_widget.insert(tk.END, decoder.decode(data, final=done))
+        text_widget.config(state=tk.DISABLED)
+        if done:
+            more_btn.pack_forget()
+        else:
+            more_btn.config(text=f"Load More ({position['offset'] * 100 // size}% shown)")
+            more_btn.pack(side=tk.LEFT, padx=5)
+
+    def load_more():
+        try:
+            load_page()
+        except (OSError, SecureFileError) as e:
+            messagebox.showerror("Error", f"Failed to read file: {e}")
+
+    more_btn.config(command=load_more)
+    load_page()
+
 def open_secure_file_window(username, role):
     sf_window = tk.Toplevel(root)
     sf_window.title(f"Secure File Operations - {username} ({role})")
@@ -238,17 +375,19 @@ def open_secure_file_window(username, role):
     role_label = tk.Label(sf_window, text=f"Role: {role}", font=("Segoe UI", 10), bg="white")
     role_label.pack(pady=(0, 5))
     
-    # Database status
-    connection = create_database_connection()
-    if connection:
-        status_text = "🟢 Database Connected"
-        connection.close()
-    else:
-        status_text = "🔴 Database Disconnected"
-    
-    db_status_label = tk.Label(sf_window, text=status_text, font=("Segoe UI", 9), bg="white", fg="gray")
+    # Database status (checked in the background so a slow database doesn't block the window)
+    db_status_label = tk.Label(sf_window, text="⏳ Checking database...", font=("Segoe UI", 9),
+                               bg="white", fg="gray")
     db_status_label.pack(pady=(0, 10))
 
+    def check_database(task):
+        with pooled_connection():
+            return True
+
+    executor.submit(check_database, owner=sf_window,
+                    on_success=lambda _: db_status_label.config(text="🟢 Database Connected"),
+                    on_error=lambda _: db_status_label.config(text="🔴 Database Disconnected"))
+
     # Frame for file actions
     actions_frame = tk.Frame(sf_window, bg="white")
     actions_frame.pack(fill="both", expand=True, padx=20, pady=10)
@@ -302,6 +441,19 @@ def open_user_management():
     tab1 = tk.Frame(notebook, bg="white")
     notebook.add(tab1, text="View Users")
     
+    # Filters (applied by the database, not in the window)
+    filter_frame = tk.Frame(tab1, bg="white")
+    filter_frame.pack(fill="x", padx=10, pady=(10, 0))
+
+    tk.Label(filter_frame, text="Role:", font=("Segoe UI", 10), bg="white").pack(side=tk.LEFT)
+    role_filter = tk.StringVar(value="all")
+    ttk.Combobox(filter_frame, textvariable=role_filter, values=["all", "admin", "user"],
+                 state="readonly", font=("Segoe UI", 10), width=8).pack(side=tk.LEFT, padx=(5, 15))
+
+    tk.Label(filter_frame, text="Username starts with:", font=("Segoe UI", 10), bg="white").pack(side=tk.LEFT)
+    prefix_input = tk.Entry(filter_frame, font=("Segoe UI", 10), width=15, relief="solid")
+    prefix_input.pack(side=tk.LEFT, padx=5)
+
     # Users Listbox
     users_frame = tk.Frame(tab1, bg="white")
     users_frame.pack(fill="both", expand=True, padx=10, pady=10)
@@ -312,8 +464,20 @@ def open_user_management():
     users_scrollbar = tk.Scrollbar(users_frame)
     users_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
     
-    users_listbox.config(yscrollcommand=users_scrollbar.set)
+    def on_users_scrolled(first, last):
+        users_scrollbar.set(first, last)
+        # Fetch the next page once the user scrolls near the end of what is loaded
+        if float(last) > 0.9:
+            load_next_page()
+
+    users_listbox.config(yscrollcommand=on_users_scrolled)
     users_scrollbar.config(command=users_listbox.yview)
+
+    users_status = tk.Label(tab1, text="", font=("Segoe UI", 9), bg="white", fg="gray")
+    users_status.pack(anchor="w", padx=10)
+
+    # Paging state; generation discards pages that arrive after the filters changed
+    listing = {'cursor': None, 'has_more': True, 'loading': False, 'generation': 0, 'count': 0}
     
     def delete_selected_user():  # <-- FIX 1: Proper indentation
         selection = users_listbox.curselection()
@@ -328,30 +492,63 @@ def open_user_management():
         if not confirm:
             return
 
-        if delete_user_from_db(username):
+        def delete_user(task):
+            if not delete_user_from_db(username):
+                return False
             from face_module import delete_face_data
             delete_face_data(username)
-            messagebox.showinfo("Deleted", f"User '{username}' deleted successfully!")
-            refresh_users()
-        else:
-            messagebox.showerror("Error", f"Failed to delete user '{username}'.")
+            return True
+
+        def on_deleted(deleted):
+            if deleted:
+                messagebox.showinfo("Deleted", f"User '{username}' deleted successfully!")
+                refresh_users()
+            else:
+                messagebox.showerror("Error", f"Failed to delete user '{username}'.")
+
+        executor.submit(delete_user, owner=mgmt_window, on_success=on_deleted,
+                        on_error=lambda e: messagebox.showerror("Error", f"Failed to delete user '{username}': {e}"))
+
+    def load_next_page():
+        if listing['loading'] or not listing['has_more']:
+            return
+        listing['loading'] = True
+        generation = listing['generation']
+        after = listing['cursor']
+        role = None if role_filter.get() == "all" else role_filter.get()
+        prefix = prefix_input.get().strip() or None
+
+        def failed(error):
+            if generation == listing['generation']:
+                listing['loading'] = False
+                messagebox.showerror("Database Error", f"Error fetching users: {error}")
+
+        executor.submit(lambda task: list_users_page(after, USER_PAGE_SIZE, role, prefix), owner=mgmt_window,
+                        on_success=lambda page: show_page(generation, page), on_error=failed)
+        users_status.config(text="Loading users...")
+
+    def show_page(generation, page):
+        if generation != listing['generation']:
+            return
+        users, next_cursor = page
+        for user in users:
+            user_info = f"{user[0]} ({user[1]}) - Created: {user[2]} - Last Login: {user[3] or 'Never'}"
+            users_listbox.insert(tk.END, user_info)
+        listing.update(cursor=next_cursor, has_more=next_cursor is not None, loading=False,
+                       count=listing['count'] + len(users))
+        more = " - scroll down for more" if listing['has_more'] else ""
+        users_status.config(text=f"Showing {listing['count']} users{more}")
+        # Keep going until the visible area is filled
+        if listing['has_more'] and users_listbox.yview()[1] >= 1.0:
+            load_next_page()
 
     def refresh_users():
+        listing.update(cursor=None, has_more=True, loading=False, generation=listing['generation'] + 1, count=0)
         users_listbox.delete(0, tk.END)
-        connection = create_database_connection()
-        if connection:
-            try:
-                cursor = connection.cursor()
-                cursor.execute("SELECT username, role, created_at, last_login FROM users ORDER BY created_at")
-                users = cursor.fetchall()
-                for user in users:
-                    user_info = f"{user[0]} ({user[1]}) - Created: {user[2]} - Last Login: {user[3] or 'Never'}"
-                    users_listbox.insert(tk.END, user_info)
-            except Exception as e:
-                messagebox.showerror("Database Error", f"Error fetching users: {e}")
-            finally:
-                cursor.close()
-                connection.close()
+        load_next_page()
+
+    prefix_input.bind('<Return>', lambda e: refresh_users())
+    role_filter.trace_add("write", lambda *args: refresh_users())
     
     # Initial load
     refresh_users()
@@ -419,10 +616,11 @@ def create_secure_file(filename, username):
         return
     
     try:
-        with open(full_path, 'w') as f:
-            f.write(f"# Secure File created by {username}\n")
-            f.write(f"# Created on: {os.popen('date /t').read().strip()}\n\n")
-            f.write("Your secure content goes here...\n")
+        write_text(full_path,
+                   f"# Secure File created by {username}\n" +
+                   f"# Created on: {os.popen('date /t').read().strip()}\n\n" +
+                   "Your secure content goes here...\n")
+        get_file_index(CUSTOM_FOLDER).refresh_file(user_filename)
         
         messagebox.showinfo("File Created", f"Secure file '{user_filename}' created successfully!")
         
@@ -465,27 +663,24 @@ def open_file_editor(filename, mode, username):
     text_editor = scrolledtext.ScrolledText(text_frame, wrap=tk.WORD, font=("Consolas", 11))
     text_editor.pack(fill="both", expand=True)
     
+    # Button frame
+    button_frame = tk.Frame(editor_window, bg="white")
+    button_frame.pack(fill="x", padx=10, pady=5)
+    
     # Load existing content if reading
     if mode == "read" and os.path.exists(full_path):
         try:
-            with open(full_path, 'r') as f:
-                content = f.read()
-                text_editor.insert(tk.END, content)
-            text_editor.config(state=tk.DISABLED)  # Make read-only
+            show_file_pages(text_editor, full_path, button_frame)  # Read-only, loaded page by page
         except Exception as e:
             messagebox.showerror("Error", f"Failed to read file: {e}")
             return
     
-    # Button frame
-    button_frame = tk.Frame(editor_window, bg="white")
-    button_frame.pack(fill="x", padx=10, pady=5)
-    
     if mode == "write":
         def save_file():
             try:
                 content = text_editor.get(1.0, tk.END)
-                with open(full_path, 'w') as f:
-                    f.write(content)
+                write_text(full_path, content)
+                get_file_index(CUSTOM_FOLDER).refresh_file(user_filename)
                 messagebox.showinfo("Success", f"File '{user_filename}' saved successfully!")
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to save file: {e}")
@@ -497,9 +692,7 @@ def open_file_editor(filename, mode, username):
         # Load existing content for editing
         if os.path.exists(full_path):
             try:
-                with open(full_path, 'r') as f:
-                    content = f.read()
-                    text_editor.insert(tk.END, content)
+                text_editor.insert(tk.END, read_text(full_path))
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to load file: {e}")
     
@@ -511,12 +704,32 @@ def admin_file_access(username):
     """Admin can access all files in the system"""
     admin_window = tk.Toplevel(root)
     admin_window.title("Admin File Access")
-    admin_window.geometry("600x400")
+    admin_window.geometry("700x480")
     admin_window.configure(bg="white")
     
     header = tk.Label(admin_window, text="Admin File Access", font=("Segoe UI", 14, "bold"), bg="white")
     header.pack(pady=10)
     
+    # Sorting and filters (answered by the file index, not by scanning the folder)
+    filter_frame = tk.Frame(admin_window, bg="white")
+    filter_frame.pack(fill="x", padx=20)
+
+    tk.Label(filter_frame, text="Sort:", font=("Segoe UI", 10), bg="white").pack(side=tk.LEFT)
+    sort_var = tk.StringVar(value="name")
+    ttk.Combobox(filter_frame, textvariable=sort_var, values=["name", "size", "modified"],
+                 state="readonly", font=("Segoe UI", 10), width=9).pack(side=tk.LEFT, padx=(5, 5))
+    descending_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(filter_frame, text="Descending", variable=descending_var, font=("Segoe UI", 10),
+                   bg="white").pack(side=tk.LEFT, padx=(0, 10))
+
+    tk.Label(filter_frame, text="Owner:", font=("Segoe UI", 10), bg="white").pack(side=tk.LEFT)
+    owner_input = tk.Entry(filter_frame, font=("Segoe UI", 10), width=10, relief="solid")
+    owner_input.pack(side=tk.LEFT, padx=(5, 10))
+
+    tk.Label(filter_frame, text="Name contains:", font=("Segoe UI", 10), bg="white").pack(side=tk.LEFT)
+    contains_input = tk.Entry(filter_frame, font=("Segoe UI", 10), width=10, relief="solid")
+    contains_input.pack(side=tk.LEFT, padx=5)
+
     # File list frame
     list_frame = tk.Frame(admin_window, bg="white")
     list_frame.pack(fill="both", expand=True, padx=20, pady=10)
@@ -527,14 +740,62 @@ def admin_file_access(username):
     files_scrollbar = tk.Scrollbar(list_frame)
     files_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
     
-    files_listbox.config(yscrollcommand=files_scrollbar.set)
+    def on_files_scrolled(first, last):
+        files_scrollbar.set(first, last)
+        # Fetch the next page once the user scrolls near the end of what is loaded
+        if float(last) > 0.9:
+            load_next_page()
+
+    files_listbox.config(yscrollcommand=on_files_scrolled)
     files_scrollbar.config(command=files_listbox.yview)
-    
-    def refresh_files():
+
+    files_status = tk.Label(admin_window, text="", font=("Segoe UI", 9), bg="white", fg="gray")
+    files_status.pack(anchor="w", padx=20)
+
+    # Paging state; names holds the file name behind each listbox line
+    listing = {'cursor': None, 'has_more': True, 'names': []}
+
+    def load_next_page():
+        if not listing['has_more']:
+            return
+        try:
+            files, next_cursor = list_files(sort_var.get(), descending_var.get(), owner_input.get().strip() or None,
+                                            contains_input.get().strip() or None, listing['cursor'])
+        except Exception as e:
+            listing['has_more'] = False
+            messagebox.showerror("Error", f"Error listing files: {e}")
+            return
+        for name, owner, size, mtime_ns, _ in files:
+            modified = datetime.fromtimestamp(mtime_ns / 1e9).strftime("%Y-%m-%d %H:%M")
+            files_listbox.insert(tk.END, f"{name}  ({owner}, {size:,} bytes, {modified})")
+            listing['names'].append(name)
+        listing.update(cursor=next_cursor, has_more=next_cursor is not None)
+        more = " - scroll down for more" if listing['has_more'] else ""
+        files_status.config(text=f"Showing {len(listing['names'])} files{more}")
+        # Keep going until the visible area is filled
+        if listing['has_more'] and files_listbox.yview()[1] >= 1.0:
+            load_next_page()
+
+    def show_files():
+        listing.update(cursor=None, has_more=True, names=[])
         files_listbox.delete(0, tk.END)
-        files = list_files()
-        for file in files:
-            files_listbox.insert(tk.END, file)
+        load_next_page()
+
+    def refresh_files():
+        file_index = get_file_index(CUSTOM_FOLDER)
+        if file_index.live:
+            show_files()
+            return
+        # Without inotify the index is refreshed by periodic scans: rescan now, off the Tk thread
+        files_status.config(text="Scanning the secure folder...")
+        executor.submit(lambda task: file_index.reconcile(), owner=admin_window,
+                        on_success=lambda _: show_files(),
+                        on_error=lambda e: messagebox.showerror("Error", f"Error scanning files: {e}"))
+
+    sort_var.trace_add("write", lambda *args: show_files())
+    descending_var.trace_add("write", lambda *args: show_files())
+    owner_input.bind('<Return>', lambda e: show_files())
+    contains_input.bind('<Return>', lambda e: show_files())
     
     def open_selected_file():
         selection = files_listbox.curselection()
@@ -542,28 +803,26 @@ def admin_file_access(username):
             messagebox.showwarning("No Selection", "Please select a file to open.")
             return
         
-        filename = files_listbox.get(selection[0])
+        filename = listing['names'][selection[0]]
         full_path = get_full_path(filename)
         
         # Open in read mode for admin
+        view_window = tk.Toplevel(admin_window)
+        view_window.title(f"Admin View: {filename}")
+        view_window.geometry("600x400")
+        
+        view_buttons = tk.Frame(view_window)
+        view_buttons.pack(side=tk.BOTTOM, fill="x", padx=10, pady=(0, 10))
+        text_area = scrolledtext.ScrolledText(view_window, wrap=tk.WORD, font=("Consolas", 10))
+        text_area.pack(fill="both", expand=True, padx=10, pady=10)
         try:
-            with open(full_path, 'r') as f:
-                content = f.read()
-            
-            view_window = tk.Toplevel(admin_window)
-            view_window.title(f"Admin View: {filename}")
-            view_window.geometry("600x400")
-            
-            text_area = scrolledtext.ScrolledText(view_window, wrap=tk.WORD, font=("Consolas", 10))
-            text_area.pack(fill="both", expand=True, padx=10, pady=10)
-            text_area.insert(tk.END, content)
-            text_area.config(state=tk.DISABLED)
-            
+            show_file_pages(text_area, full_path, view_buttons)
         except Exception as e:
+            view_window.destroy()
             messagebox.showerror("Error", f"Failed to open file: {e}")
     
     # Initial load
-    refresh_files()
+    show_files()
     
     # Buttons
     btn_frame = tk.Frame(admin_window, bg="white")
@@ -652,6 +911,18 @@ status_label = tk.Label(status_frame, text="Ready - Please login or register",
                        font=("Segoe UI", 9), bg="#d0ecff", fg="gray")
 status_label.pack(pady=5)
 
+cancel_btn = tk.Button(status_frame, text="Cancel", font=("Segoe UI", 9),
+                       bg="white", fg="#333", command=cancel_current_task)
+
+# Blocking work (database, camera) runs on worker threads; results come back on the Tk loop
+executor = TkTaskExecutor(root)
+
+def on_close():
+    executor.shutdown()
+    root.destroy()
+
+root.protocol("WM_DELETE_WINDOW", on_close)
+
 # Keyboard shortcuts
 def on_enter(event):
     login_user()
@@ -663,6 +934,21 @@ password_input.bind('<Return>', on_enter)
 if __name__ == "__main__":
     # Ensure required directories exist
     create_directory_if_not_exists(CUSTOM_FOLDER)
+    # Reconcile the file index with the folder and keep it current in the background
+    get_file_index(CUSTOM_FOLDER)
+
+    if WARM_UP_FACE_MODELS:
+        # The import lock makes a login that starts mid-warm-up simply wait for it
+        start_face_model_warm_up()
+
+    if RUN_LOGIN_RETENTION:
+        start_login_retention()
+
+    if SEED_LOGIN_THROTTLE:
+        executor.submit(lambda task: seed_login_throttle(), name="seed login throttle")
+
+    # Calibrate the password hashing cost now rather than during the first login
+    executor.submit(lambda task: get_password_hasher().log_cost, name="calibrate password hashing")
     
     # Start the GUI
     root.mainloop()
@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+THROTTLE_WINDOW = 900.0  # Seconds a failed login counts against its username and source address
+THROTTLE_MAX_USER_FAILURES = 5  # Failures per username within the window before logins are refused
+THROTTLE_MAX_ADDRESS_FAILURES = 20  # Failures per source address within the window (any usernames)
+THROTTLE_MAX_KEYS = 10000  # Usernames/addresses tracked; the least recently failed are forgotten first
+# Addresses that stand for "this machine": the GUI logs every attempt with one of them, so they
+# identify no client and are never limited (one lockout would otherwise lock out every user)
+LOCAL_ADDRESSES = frozenset({"127.0.0.1", "::1"})
+
+class LoginThrottle:
+    """In-process sliding-window limit on failed logins per username and per source address
+
+    Each key keeps a ring buffer with the times of its last max_failures
+    failures. A key is locked out while its buffer is full and the oldest
+    entry is still inside the window, which is exact for a sliding window
+    and makes check() and record_failure() O(1) without touching the
+    database. Addresses only count when they name a client (not None or
+    LOCAL_ADDRESSES). A successful login clears its username and takes
+    one failure off its address, so a shared address recovers as its
+    users log in without an attacker being able to wipe its count.
+    """
+
+    def __init__(self, window=THROTTLE_WINDOW, max_user_failures=THROTTLE_MAX_USER_FAILURES,
+                 max_address_failures=THROTTLE_MAX_ADDRESS_FAILURES, max_keys=THROTTLE_MAX_KEYS,
+                 clock=time.time):
+        self.window = window
+        self.limits = {'user': max_user_failures, 'address': max_address_failures}
+        self.max_keys = max_keys
+        self.clock = clock
+        self._failures = OrderedDict()  # (kind, value) -> deque of failure times, least recently failed first
+        self._lock = threading.Lock()
+        self._stats = {'checked': 0, 'refused': 0, 'failures': 0, 'seeded': 0}
+
+    @staticmethod
+    def _keys(username, ip_address):
+        keys = []
+        if username:
+            # Usernames are unique case-insensitively, so are their counters
+            keys.append(('user', username.lower()))
+        if ip_address and ip_address not in LOCAL_ADDRESSES:
+            keys.append(('address', ip_address))
+        return keys
+
+    def check(self, username, ip_address=None):
+        """Seconds until this username/address may try again (0 if a login is allowed now)"""
+        now = self.clock()
+        retry_after = 0.0
+        with self._lock:
+            self._stats['checked'] += 1
+            for key in self._keys(username, ip_address):
+                failures = self._failures.get(key)
+                if failures is not None and len(failures) == failures.maxlen:
+                    retry_after = max(retry_after, failures[0] + self.window - now)
+            if retry_after > 0:
+                self._stats['refused'] += 1
+        return max(retry_after, 0.0)
+
+    def record_failure(self, username, ip_address=None, at=None):
+        at = self.clock() if at is None else at
+        with self._lock:
+            self._stats['failures'] += 1
+            for key in self._keys(username, ip_address):
+                failures = self._failures.pop(key, None)
+                if failures is None:
+                    failures = deque(maxlen=self.limits[key[0]])
+                failures.append(at)
+                self._failures[key] = failures
+            while len(self._failures) > self.max_keys:
+                self._failures.popitem(last=False)
+
+    def record_success(self, username, ip_address=None):
+        with self._lock:
+            for key in self._keys(username, ip_address):
+                if key[0] == 'user':
+                    self._failures.pop(key, None)
+                    continue
+                failures = self._failures.get(key)
+                if failures:
+                    failures.popleft()
+                    if not failures:
+                        del self._failures[key]
+
+    def seed(self, attempts):
+        """Replay recent (username, ip_address, attempt_time, success) rows, oldest first
+
+        attempt_time is a datetime (as stored in login_attempts) or a Unix
+        time. Failures recorded live while seeding are kept: the seeded ones
+        are merged in before them.
+        """
+        replay = LoginThrottle(self.window, self.limits['user'], self.limits['address'], self.max_keys, self.clock)
+        cutoff = self.clock() - self.window
+        count = 0
+        for username, ip_address, attempt_time, success in attempts:
+            at = attempt_time.timestamp() if hasattr(attempt_time, 'timestamp') else float(attempt_time)
+            if at < cutoff:
+                continue
+            if success:
+                replay.record_success(username, ip_address)
+            else:
+                replay.record_failure(username, ip_address, at)
+            count += 1
+
+        with self._lock:
+            for key, seeded in replay._failures.items():
+                live = self._failures.pop(key, None)
+                merged = deque(sorted(list(seeded) + list(live or ())), maxlen=self.limits[key[0]])
+                self._failures[key] = merged
+            while len(self._failures) > self.max_keys:
+                self._failures.popitem(last=False)
+            self._stats['seeded'] += count
+        return count
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, tracked_keys=len(self._failures))
@@ -0,0 +1,152 @@
+import base64
+import hashlib
+import hmac
+import os
+import re
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HASH_SCHEME = "scrypt"  # Memory-hard KDF from the standard library (OpenSSL)
+HASH_VERSION = 1  # Bump when the encoding or scheme changes; older hashes are upgraded at login
+HASH_LOG_COST = None  # Fixed log2 of the scrypt cost N; None calibrates it at startup
+HASH_TARGET_SECONDS = 0.1  # Calibration budget for one hash on this machine
+HASH_MIN_LOG_COST = 14  # Never go below N = 2**14 (16 MiB per hash with r = 8)
+HASH_MAX_LOG_COST = 17  # ...or above N = 2**17 (128 MiB per hash)
+HASH_BLOCK_SIZE = 8  # scrypt r
+HASH_PARALLELISM = 1  # scrypt p
+HASH_SALT_BYTES = 16
+HASH_KEY_BYTES = 32
+HASH_WORKERS = min(4, os.cpu_count() or 1)  # Hashes computed at once (each needs 128 * r * N bytes)
+
+# $scrypt$v=1$ln=15,r=8,p=1$<salt>$<key>, salt and key in unpadded base64
+ENCODED_HASH = re.compile(
+    r"^\$(?P<scheme>\w+)\$v=(?P<version>\d+)\$ln=(?P<ln>\d+),r=(?P<r>\d+),p=(?P<p>\d+)"
+    r"\$(?P<salt>[A-Za-z0-9+/]+)\$(?P<key>[A-Za-z0-9+/]+)$"
+)
+LEGACY_SHA256 = re.compile(r"^[0-9a-f]{64}$")  # Unsalted SHA-256 hex digests from before version 1
+
+def _b64encode(data):
+    return base64.b64encode(data).decode('ascii').rstrip("=")
+
+def _b64decode(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+def _scrypt(password, salt, log_cost, block_size, parallelism, key_bytes=HASH_KEY_BYTES):
+    # hashlib releases the GIL while scrypt runs, so pool threads use separate cores
+    n = 1 << log_cost
+    return hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=block_size, p=parallelism,
+                          maxmem=256 * block_size * n, dklen=key_bytes)
+
+def calibrate(target_seconds=HASH_TARGET_SECONDS, min_log_cost=HASH_MIN_LOG_COST, max_log_cost=HASH_MAX_LOG_COST,
+              block_size=HASH_BLOCK_SIZE, parallelism=HASH_PARALLELISM):
+    """Largest log2(N) whose hash fits the time budget on this machine (doubling N doubles the time)"""
+    salt = secrets.token_bytes(HASH_SALT_BYTES)
+    log_cost = min_log_cost
+    while log_cost < max_log_cost:
+        started = time.perf_counter()
+        _scrypt("calibration", salt, log_cost, block_size, parallelism)
+        if (time.perf_counter() - started) * 2 > target_seconds:
+            break
+        log_cost += 1
+    return log_cost
+
+class PasswordHasher:
+    """Salted, versioned scrypt hashes computed on a bounded worker pool
+
+    hash() returns an encoded string that carries its own parameters, so
+    hashes made with an older cost (or the legacy unsalted SHA-256) keep
+    verifying; needs_rehash() tells the login path to upgrade them. Callers
+    block until their hash is done, so call from a worker thread, never
+    from the Tk thread.
+    """
+
+    def __init__(self, log_cost=HASH_LOG_COST, workers=HASH_WORKERS, block_size=HASH_BLOCK_SIZE,
+                 parallelism=HASH_PARALLELISM, target_seconds=HASH_TARGET_SECONDS):
+        self.block_size = block_size
+        self.parallelism = parallelism
+        self.target_seconds = target_seconds
+        self._log_cost = log_cost
+        self._calibration_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._dummy_hash = None
+
+    @property
+    def log_cost(self):
+        """Cost used for new hashes (calibrated on first use unless fixed)"""
+        if self._log_cost is None:
+            with self._calibration_lock:
+                if self._log_cost is None:
+                    self._log_cost = calibrate(self.target_seconds, block_size=self.block_size,
+                                               parallelism=self.parallelism)
+                    print(f"✅ Password hashing calibrated to scrypt N=2**{self._log_cost}")
+        return self._log_cost
+
+    def hash(self, password):
+        return self.hash_many([password])[0]
+
+    def hash_many(self, passwords):
+        """Hash several passwords in parallel on the pool"""
+        log_cost = self.log_cost
+        salts = [secrets.token_bytes(HASH_SALT_BYTES) for _ in passwords]
+        keys = self._pool.map(lambda args: _scrypt(*args),
+                              [(password, salt, log_cost, self.block_size, self.parallelism)
+                               for password, salt in zip(passwords, salts)])
+        return [self._encode(salt, key, log_cost) for salt, key in zip(salts, keys)]
+
+    def verify(self, password, encoded):
+        """Check a password against a stored hash (any supported version)"""
+        if encoded and LEGACY_SHA256.match(encoded):
+            legacy = hashlib.sha256(password.encode('utf-8')).hexdigest()
+            return hmac.compare_digest(encoded, legacy)
+
+        match = ENCODED_HASH.match(encoded or "")
+        if match is None or match['scheme'] != HASH_SCHEME or int(match['version']) != HASH_VERSION:
+            return False
+        key = _b64decode(match['key'])
+        computed = self._pool.submit(_scrypt, password, _b64decode(match['salt']), int(match['ln']),
+                                     int(match['r']), int(match['p']), len(key)).result()
+        return hmac.compare_digest(key, computed)
+
+    def verify_missing(self, password):
+        """Spend a verification's time for an unknown user, so timing does not reveal which names exist"""
+        if self._dummy_hash is None:
+            self._dummy_hash = self.hash(secrets.token_hex(8))
+        self.verify(password, self._dummy_hash)
+
+    def needs_rehash(self, encoded):
+        """True if a stored hash uses an older scheme, version or a lower cost than new hashes"""
+        match = ENCODED_HASH.match(encoded or "")
+        if match is None or match['scheme'] != HASH_SCHEME or int(match['version']) != HASH_VERSION:
+            return True
+        # Only upgrade: a faster machine calibrating a lower cost must not weaken stored hashes
+        return (int(match['ln']) < self.log_cost or int(match['r']) != self.block_size
+                or int(match['p']) != self.parallelism)
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+
+    def _encode(self, salt, key, log_cost):
+        return (f"${HASH_SCHEME}$v={HASH_VERSION}$ln={log_cost},r={self.block_size},p={self.parallelism}"
+                f"${_b64encode(salt)}${_b64encode(key)}")
+
+_hasher = None
+_hasher_lock = threading.Lock()
+
+def get_password_hasher():
+    """Return the process-wide password hasher"""
+    global _hasher
+    if _hasher is None:
+        with _hasher_lock:
+            if _hasher is None:
+                _hasher = PasswordHasher()
+    return _hasher
+
+def set_password_hasher(hasher):
+    """Replace the process-wide password hasher (benchmarks, fixed-cost deployments)"""
+    global _hasher
+    with _hasher_lock:
+        previous, _hasher = _hasher, hasher
+    if previous is not None:
+        previous.close()
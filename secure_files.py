@@ -0,0 +1,243 @@
+import hashlib
+import hmac
+import os
+import secrets
+import struct
+import tempfile
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+# 256-bit master key, created on first use next to the program (not wherever it was started from,
+# which would silently create a second key); keep it out of the secure folder
+KEY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "secure_files.key")
+CHUNK_SIZE = 64 * 1024  # Plaintext bytes per independently authenticated chunk
+FORMAT_VERSION = 1
+
+# Header: magic, version, chunk size, per-file salt (the file key is derived from it)
+HEADER = struct.Struct("<4sHI16s")
+MAGIC = b"SFC1"
+TAG_SIZE = 16  # AES-GCM authentication tag appended to every chunk
+
+class SecureFileError(Exception):
+    """A secure file is corrupt, truncated or was encrypted with another key"""
+
+def load_master_key(path=KEY_FILE):
+    """Read the master key, creating it (readable by the owner only) if it does not exist yet"""
+    try:
+        with open(path, 'rb') as f:
+            key = f.read()
+    except FileNotFoundError:
+        key = secrets.token_bytes(32)
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o600)
+        except FileExistsError:
+            # Another process created it first
+            return load_master_key(path)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(key)
+            f.flush()
+            os.fsync(f.fileno())
+    if len(key) != 32:
+        raise SecureFileError(f"Master key {path} is not 32 bytes")
+    return key
+
+def _file_cipher(master_key, salt):
+    # A fresh salt per written file gives every file version its own key, so chunk nonces never repeat
+    return AESGCM(hmac.new(master_key, b"secure-file-v1" + salt, hashlib.sha256).digest())
+
+def _nonce(index):
+    return struct.pack("<Q", index) + b"\0\0\0\0"
+
+def _associated_data(header, index, final):
+    # Binds each chunk to its file, position and whether it ends the file (detects reordering and truncation)
+    return header + struct.pack("<QB", index, final)
+
+def is_encrypted(path):
+    """True if path starts with the secure file header (older files are plain text)"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+class SecureFileWriter:
+    """Stream plaintext into an encrypted container, one chunk at a time
+
+    Writes go to a temporary file in the same folder that replaces path
+    on close(), so readers never see a half-written file and a failed
+    save leaves the previous version in place. Memory use is one chunk.
+    """
+
+    def __init__(self, path, master_key=None, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.header = HEADER.pack(MAGIC, FORMAT_VERSION, chunk_size, secrets.token_bytes(16))
+        self._cipher = _file_cipher(master_key or load_master_key(), self.header[-16:])
+        self._buffer = bytearray()
+        self._index = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, self._temp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+        self._file = os.fdopen(fd, 'wb')
+        self._file.write(self.header)
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self._buffer += data
+        # Keep the last full chunk buffered: only close() knows which chunk is final
+        while len(self._buffer) > self.chunk_size:
+            self._write_chunk(bytes(self._buffer[:self.chunk_size]), final=False)
+            del self._buffer[:self.chunk_size]
+
+    def close(self):
+        if self._file is None:
+            return
+        try:
+            # Always end with a final chunk (possibly empty), so truncation is detectable
+            self._write_chunk(bytes(self._buffer), final=True)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+            os.replace(self._temp_path, self.path)
+        except BaseException:
+            self.abort()
+            raise
+
+    def abort(self):
+        """Discard everything written; path is left untouched"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _write_chunk(self, chunk, final):
+        ciphertext = self._cipher.encrypt(_nonce(self._index), chunk,
+                                          _associated_data(self.header, self._index, final))
+        self._file.write(ciphertext)
+        self._index += 1
+
+class SecureFileReader:
+    """Random-access reads from an encrypted container
+
+    The plaintext size and the location of every chunk follow from the
+    file size and the header, so read(offset, length) seeks straight to
+    the chunks it needs and decrypts only those.
+    """
+
+    def __init__(self, path, master_key=None):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self.header = self._file.read(HEADER.size)
+            if len(self.header) < HEADER.size:
+                raise SecureFileError(f"{path} is not a secure file")
+            magic, version, self.chunk_size, salt = HEADER.unpack(self.header)
+            if magic != MAGIC or version != FORMAT_VERSION or self.chunk_size <= 0:
+                raise SecureFileError(f"{path} is not a secure file (or uses an unknown version)")
+            self._cipher = _file_cipher(master_key or load_master_key(), salt)
+
+            stored = os.fstat(self._file.fileno()).st_size - HEADER.size
+            record = self.chunk_size + TAG_SIZE
+            self.chunk_count = max(1, -(-stored // record))
+            last = stored - (self.chunk_count - 1) * record - TAG_SIZE
+            if last < 0:
+                raise SecureFileError(f"{path} is truncated")
+            self.size = (self.chunk_count - 1) * self.chunk_size + last
+        except BaseException:
+            self._file.close()
+            raise
+
+    def read_chunk(self, index):
+        """Decrypt and authenticate one chunk"""
+        record = self.chunk_size + TAG_SIZE
+        self._file.seek(HEADER.size + index * record)
+        ciphertext = self._file.read(record)
+        final = index == self.chunk_count - 1
+        try:
+            return self._cipher.decrypt(_nonce(index), ciphertext, _associated_data(self.header, index, final))
+        except InvalidTag:
+            raise SecureFileError(f"{self.path}: chunk {index} failed authentication") from None
+
+    def read(self, offset=0, length=None):
+        """Plaintext bytes [offset, offset + length), decrypting only the chunks they span"""
+        if length is None:
+            length = self.size - offset
+        end = min(self.size, offset + length)
+        if offset >= end:
+            return b""
+        first, last = offset // self.chunk_size, (end - 1) // self.chunk_size
+        data = b"".join(self.read_chunk(index) for index in range(first, last + 1))
+        start = offset - first * self.chunk_size
+        return data[start:start + end - offset]
+
+    def chunks(self):
+        """Iterate over the plaintext chunk by chunk (constant memory)"""
+        for index in range(self.chunk_count):
+            yield self.read_chunk(index)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class PlainFileReader:
+    """The SecureFileReader interface over a file written before encryption (plain text)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+
+    def read(self, offset=0, length=None):
+        self._file.seek(offset)
+        return self._file.read() if length is None else self._file.read(length)
+
+    def chunks(self):
+        self._file.seek(0)
+        while True:
+            chunk = self._file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def open_secure_file(path, master_key=None):
+    """Reader for path: SecureFileReader for containers, PlainFileReader for older plain text files"""
+    if is_encrypted(path):
+        return SecureFileReader(path, master_key)
+    return PlainFileReader(path)
+
+def read_text(path, offset=0, length=None):
+    """Decoded text of a secure (or older plain text) file"""
+    with open_secure_file(path) as reader:
+        return reader.read(offset, length).decode('utf-8', errors='replace')
+
+def write_text(path, text):
+    """Replace path with an encrypted container holding text"""
+    with SecureFileWriter(path) as writer:
+        data = text.encode('utf-8')
+        for start in range(0, len(data), writer.chunk_size):
+            writer.write(data[start:start + writer.chunk_size])
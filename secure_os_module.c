@@ -5,6 +5,18 @@
 #include <sys/stat.h>  // For mkdir
 
 #define CUSTOM_FOLDER "C:\\Users\\DELL\\Desktop\\secure folder"
+#define SECURE_FILE_MAGIC "SFC1"  // Header of files saved (encrypted) by the Python GUI
+
+/* Files saved by the GUI are encrypted containers (see secure_files.py): only the GUI can open them */
+int is_encrypted_file(const char *path) {
+    char magic[4];
+    FILE *fp = fopen(path, "rb");
+    if (fp == NULL)
+        return 0;
+    size_t n = fread(magic, 1, sizeof(magic), fp);
+    fclose(fp);
+    return n == sizeof(magic) && memcmp(magic, SECURE_FILE_MAGIC, sizeof(magic)) == 0;
+}
 
 void create_user_file(const char *username) {
     char filename[256];
@@ -34,6 +46,11 @@ void read_user_file(const char *username) {
     scanf("%255s", filename);
     snprintf(user_filename, sizeof(user_filename), "%s\\%s_%s.txt", CUSTOM_FOLDER, username, filename);
 
+    if (is_encrypted_file(user_filename)) {
+        printf("%s is encrypted. Open it from the Secure File System GUI.\n", user_filename);
+        return;
+    }
+
     FILE *fp = fopen(user_filename, "r");
     if (fp == NULL) {
         printf("No file found in folder. Access denied.\n");
@@ -55,6 +72,12 @@ void write_user_file(const char *username) {
     scanf("%255s", filename);
     snprintf(user_filename, sizeof(user_filename), "%s\\%s_%s.txt", CUSTOM_FOLDER, username, filename);
 
+    if (is_encrypted_file(user_filename)) {
+        // Appending plain text would corrupt the container
+        printf("%s is encrypted. Edit it from the Secure File System GUI.\n", user_filename);
+        return;
+    }
+
     FILE *fp = fopen(user_filename, "a");
     if (fp == NULL) {
         printf("No file found in folder. Access denied.\n");
@@ -86,7 +109,8 @@ void access_all_files() {
         HANDLE hFind;
         char search_path[500];
         int count = 0;
-        char files[100][256];
+        int capacity = 0;
+        char (*files)[MAX_PATH] = NULL;  // Grows as needed: every file is listed, however many there are
 
         snprintf(search_path, sizeof(search_path), "%s\\*.txt", CUSTOM_FOLDER);
         hFind = FindFirstFileA(search_path, &findFileData);
@@ -95,14 +119,25 @@ void access_all_files() {
             return;
         }
         do {
+            if (count == capacity) {
+                int new_capacity = capacity ? capacity * 2 : 128;
+                char (*grown)[MAX_PATH] = realloc(files, new_capacity * sizeof(*files));
+                if (grown == NULL) {
+                    printf("Out of memory after listing %d files.\n", count);
+                    break;
+                }
+                files = grown;
+                capacity = new_capacity;
+            }
             printf("%d. %s\n", count + 1, findFileData.cFileName);
-            strcpy(files[count], findFileData.cFileName);
+            strncpy(files[count], findFileData.cFileName, MAX_PATH - 1);
+            files[count][MAX_PATH - 1] = '\0';
             count++;
-            if (count >= 100) break;
         } while (FindNextFileA(hFind, &findFileData));
         FindClose(hFind);
 
         if (count == 0) {
+            free(files);
             printf("No .txt files found in %s folder.\n", CUSTOM_FOLDER);
             return;
         }
@@ -112,12 +147,18 @@ void access_all_files() {
         scanf("%d", &choice);
         getchar(); // consume newline
         if (choice < 1 || choice > count) {
+            free(files);
             printf("Cancelled or invalid choice.\n");
             return;
         }
 
-        char full_path[500];
+        char full_path[MAX_PATH + 300];
         snprintf(full_path, sizeof(full_path), "%s\\%s", CUSTOM_FOLDER, files[choice - 1]);
+        free(files);
+        if (is_encrypted_file(full_path)) {
+            printf("%s is encrypted. Open it from the Secure File System GUI.\n", full_path);
+            return;
+        }
         FILE *fp = fopen(full_path, "r");
         if (!fp) {
             printf("Error opening file.\n");
@@ -134,6 +175,10 @@ void access_all_files() {
         printf("Enter the exact name of the file to read (including .txt): ");
         scanf("%299s", filename);
         snprintf(full_path, sizeof(full_path), "%s\\%s", CUSTOM_FOLDER, filename);
+        if (is_encrypted_file(full_path)) {
+            printf("%s is encrypted. Open it from the Secure File System GUI.\n", full_path);
+            return;
+        }
 
         FILE *fp = fopen(full_path, "r");
         if (!fp) {
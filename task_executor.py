@@ -0,0 +1,133 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+TASK_WORKERS = 4  # Threads available for blocking GUI work (database, camera)
+TASK_POLL_MS = 50  # How often the Tk loop checks for finished tasks while any are running
+
+class Task:
+    """Handle for one background task, shared by the worker and the Tk thread"""
+
+    def __init__(self, name):
+        self.name = name
+        self.cancel_event = threading.Event()
+        self.done = False
+        self._future = None
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        """Ask the task to stop; a task that has not started yet never runs"""
+        self.cancel_event.set()
+        if self._future is not None:
+            self._future.cancel()
+
+class TkTaskExecutor:
+    """Run blocking work on a thread pool and deliver its results on the Tk thread
+
+    Worker threads never touch widgets: they put results, errors and
+    progress on a queue that the Tk event loop drains with root.after(),
+    so callbacks can update the UI directly. A function submitted with
+    submit(fn, ...) is called as fn(task, *args); long-running work should
+    check task.cancelled (or pass task.cancel_event on, e.g. to
+    verify_face) and may call executor.progress(task, message).
+    """
+
+    def __init__(self, root, max_workers=TASK_WORKERS, poll_ms=TASK_POLL_MS):
+        self.root = root
+        self.poll_ms = poll_ms
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gui-task")
+        self._results = queue.Queue()
+        self._callbacks = {}  # Task -> (on_success, on_error, on_progress, on_cancelled, owner)
+        self._polling = False
+
+    def submit(self, fn, *args, on_success=None, on_error=None, on_progress=None, on_cancelled=None,
+               owner=None, name=None):
+        """Run fn(task, *args) on a worker thread and return its Task
+
+        on_success(result), on_error(exception) and on_progress(message) run
+        on the Tk thread. A cancelled task gets on_cancelled(None) instead,
+        once its worker has actually stopped. Nothing is delivered if owner
+        (a widget, e.g. the window that asked) has been destroyed.
+        """
+        task = Task(name or getattr(fn, "__name__", "task"))
+        self._callbacks[task] = (on_success, on_error, on_progress, on_cancelled, owner)
+        task._future = self._pool.submit(self._run, task, fn, args)
+        self._schedule_poll()
+        return task
+
+    def progress(self, task, message):
+        """Report progress from a worker thread (delivered to on_progress on the Tk thread)"""
+        self._results.put((task, "progress", message))
+
+    def running(self):
+        """Tasks submitted and not finished yet"""
+        return [task for task in self._callbacks if not task.done]
+
+    def cancel_all(self):
+        for task in self.running():
+            task.cancel()
+
+    def shutdown(self):
+        """Cancel everything and stop accepting work (does not wait for running tasks)"""
+        self.cancel_all()
+        self._pool.shutdown(wait=False)
+
+    def _run(self, task, fn, args):
+        if task.cancelled:
+            self._results.put((task, "cancelled", None))
+            return
+        try:
+            result = fn(task, *args)
+        except Exception as e:
+            self._results.put((task, "error", e))
+        else:
+            self._results.put((task, "success", result))
+
+    def _schedule_poll(self):
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.poll_ms, self._poll)
+
+    def _poll(self):
+        self._polling = False
+        while True:
+            try:
+                task, kind, value = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._deliver(task, kind, value)
+
+        # Tasks cancelled before they started never report back
+        for task in list(self._callbacks):
+            if task._future.cancelled():
+                self._deliver(task, "cancelled", None)
+
+        if self._callbacks:
+            self._schedule_poll()
+
+    def _deliver(self, task, kind, value):
+        callbacks = self._callbacks.get(task)
+        if callbacks is None:
+            return
+        on_success, on_error, on_progress, on_cancelled, owner = callbacks
+        if kind != "progress":
+            task.done = True
+            del self._callbacks[task]
+
+        if owner is not None and not owner.winfo_exists():
+            return
+        if task.cancelled or kind == "cancelled":
+            callback, value = (None if kind == "progress" else on_cancelled), None
+        elif kind == "progress":
+            callback = on_progress
+        elif kind == "success":
+            callback = on_success
+        else:
+            callback = on_error
+            if callback is None:
+                print(f"❌ Background task '{task.name}' failed: {value}")
+        if callback is not None:
+            callback(value)